@@ -1,5 +1,5 @@
 import os
-from flask import Flask
+from flask import Flask, jsonify
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,7 +13,46 @@ def create_app(test_config=None):
             # Configuration for file uploads
             MAX_CONTENT_LENGTH = 16 * 1024 * 1024,  # 16MB max file size
             UPLOAD_FOLDER = os.path.join(app.static_folder, 'uploads'),
-            ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+            ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'},
+            # Pagination for the feed, author listings and comments
+            PAGE_SIZE = 20,
+            MAX_PAGE_SIZE = 100,
+            # SQLite connection tuning, see db.connect
+            SQLITE_REUSE_CONNECTIONS = True,
+            SQLITE_WAL = True,
+            SQLITE_SYNCHRONOUS = 'NORMAL',
+            SQLITE_CACHE_SIZE_KB = 16 * 1024,
+            SQLITE_MMAP_SIZE = 256 * 1024 * 1024,
+            SQLITE_BUSY_TIMEOUT_MS = 5000,
+            SQLITE_STATEMENT_CACHE = 256,
+            # Apply pending migrations to an existing database when the app starts;
+            # when off, the app refuses to start until 'flask migrate-db' is run
+            MIGRATE_ON_STARTUP = True,
+            # Upper bound on rendered responses kept by Blog.cache
+            RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024,
+            # Logged-in user rows kept by Blog.cache, and for how many seconds
+            USER_CACHE_SIZE = 1024,
+            USER_CACHE_TTL = 5,
+            # Threads resizing uploaded images in Blog.images, and the largest
+            # width * height an upload may have before it is rejected
+            IMAGE_WORKERS = 2,
+            MAX_IMAGE_PIXELS = 40 * 1000 * 1000,
+            # Background social handle checks in Blog.handles; results are reused for
+            # HANDLE_CACHE_TTL seconds, or HANDLE_RETRY_TTL when the site gave no answer
+            HANDLE_WORKERS = 2,
+            HANDLE_CACHE_TTL = 24 * 60 * 60,
+            HANDLE_RETRY_TTL = 15 * 60,
+            HANDLE_TIMEOUT = 5,
+            # Password hashing runs on a process pool (Blog.passwords); requests beyond
+            # PASSWORD_WORKERS + PASSWORD_QUEUE are turned away with a 503
+            PASSWORD_WORKERS = 2,
+            PASSWORD_QUEUE = 16,
+            PASSWORD_TIMEOUT = 10,
+            # Login/register attempts per client address, and failed logins per account
+            AUTH_CLIENT_ATTEMPTS = 30,
+            AUTH_CLIENT_WINDOW = 60,
+            AUTH_ACCOUNT_FAILURES = 5,
+            AUTH_ACCOUNT_WINDOW = 5 * 60
     )
 
     if test_config is None:
@@ -37,6 +76,24 @@ def create_app(test_config=None):
     from . import db 
     db.init_app(app)
 
+    from . import cache
+    cache.init_app(app)
+
+    from . import passwords
+    passwords.init_app(app)
+
+    from . import loadtest
+    loadtest.init_app(app)
+
+    @app.route('/metrics')
+    def metrics():
+        return jsonify({
+            "response_cache": cache.get_cache().stats(),
+            "user_cache": cache.get_user_cache().stats(),
+            "passwords": passwords.stats(),
+            "google_oauth": auth.google.stats()
+        })
+
     from . import auth
     app.register_blueprint(auth.bp)
 
@@ -1,17 +1,17 @@
 import functools
 from flask import Blueprint, flash, g, redirect, render_template, request, session, url_for, current_app, jsonify
-from werkzeug.security import check_password_hash, generate_password_hash
-from werkzeug.utils import secure_filename
 from Blog.db import get_db
-import re, os, time, requests
-from functools import lru_cache
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-from oauthlib.oauth2 import WebApplicationClient
-import json
+from Blog.cache import forget_user, get_user_cache, invalidate
+from Blog.images import PROFILE_FOLDER, InvalidImage, image_set, release_images, store_upload
+from Blog.handles import refresh_statuses, verify_later
+from Blog.oauth import OAuthProvider
+from Blog.passwords import (
+    Saturated, Throttled, account_throttle, client_throttle, get_hasher
+)
+from Blog.versions import conditional
+import re, os
 
 
-UPLOAD_FOLDER = os.path.join('static', 'profile_images')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 # For development only 
@@ -21,12 +21,28 @@ os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
 GOOGLE_DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
 
 # Blueprint for auth
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
-# Initialize OAuth2 client
-client = WebApplicationClient(GOOGLE_CLIENT_ID)
+# Google OpenID client; caches provider metadata and pools connections across requests
+google = OAuthProvider(GOOGLE_DISCOVERY_URL, GOOGLE_CERTS_URL, GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET)
+
+
+def busy_response(e):
+    """JSON error for a throttled or saturated password check, with Retry-After."""
+    if isinstance(e, Throttled):
+        message, status = 'Too many attempts. Please try again later.', 429
+    else:
+        message, status = 'Server is busy. Please try again shortly.', 503
+    response = jsonify({
+        "success": False,
+        "error": message
+    })
+    response.status_code = status
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
 
 
 def allowed_file(filename):
@@ -92,33 +108,12 @@ class SocialMediaValidator:
         pattern = r'^(https?:\/\/)?(www\.)?linkedin\.com\/in\/[a-zA-Z0-9\-]{3,100}\/?$'
         return bool(re.match(pattern, url))
 
-    @staticmethod
-    @lru_cache(maxsize=100)
-    def verify_handle_exists(handle, platform):
-        """Verify if the social media handle actually exists"""
-        try:
-            if platform == 'twitter':
-                url = f"https://twitter.com/{handle}"
-            elif platform == 'instagram':
-                url = f"https://www.instagram.com/{handle}"
-            elif platform == 'linkedin':
-                url = handle
-            
-            response = requests.head(url, allow_redirects=True, timeout=5)
-            return response.status_code == 200
-        except:
-            return True
-
 
 @bp.route('/google-login')
 def google_login():
     """Initiate Google OAuth login"""
     try:
-        google_provider_cfg = requests.get(GOOGLE_DISCOVERY_URL).json()
-        authorization_endpoint = google_provider_cfg["authorization_endpoint"]
-
-        request_uri = client.prepare_request_uri(
-            authorization_endpoint,
+        request_uri = google.authorization_url(
             redirect_uri=request.base_url + "/callback",
             scope=["openid", "email", "profile"],
         )
@@ -144,38 +139,21 @@ def google_callback():
                 "error": "No authorization code received"
             }), 400
 
-        google_provider_cfg = requests.get(GOOGLE_DISCOVERY_URL).json()
-        token_endpoint = google_provider_cfg["token_endpoint"]
-
-        token_url, headers, body = client.prepare_token_request(
-            token_endpoint,
+        userinfo = google.login_claims(
             authorization_response=request.url,
             redirect_url=request.base_url,
             code=code
         )
 
-        token_response = requests.post(
-            token_url,
-            headers=headers,
-            data=body,
-            auth=(GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET),
-        )
-
-        client.parse_request_body_response(json.dumps(token_response.json()))
-        
-        userinfo_endpoint = google_provider_cfg["userinfo_endpoint"]
-        uri, headers, body = client.add_token(userinfo_endpoint)
-        userinfo_response = requests.get(uri, headers=headers, data=body)
-
-        if not userinfo_response.json().get("email_verified"):
+        if not userinfo.get("email_verified"):
             return jsonify({
                 "success": False,
                 "error": "Email not verified by Google"
             }), 400
 
-        google_id = userinfo_response.json()["sub"]
-        email = userinfo_response.json()["email"]
-        username = userinfo_response.json().get("given_name", email.split('@')[0])
+        google_id = userinfo["sub"]
+        email = userinfo["email"]
+        username = userinfo.get("given_name", email.split('@')[0])
 
         db = get_db()
         user = db.execute(
@@ -195,6 +173,7 @@ def google_callback():
 
         session.clear()
         session['user_id'] = user['id']
+        get_user_cache().put(user['id'], dict(user))
 
         return jsonify({
             "success": True,
@@ -244,10 +223,17 @@ def register():
                 "error": error
             }), 400
 
+        try:
+            client_throttle().check(request.remote_addr)
+            client_throttle().hit(request.remote_addr)
+            password_hash = get_hasher().hash(password)
+        except (Throttled, Saturated) as e:
+            return busy_response(e)
+
         try:
             db.execute(
                 'INSERT INTO user (username, password, email) VALUES (?, ?, ?)',
-                (username, generate_password_hash(password), email)
+                (username, password_hash, email)
             )
             db.commit()
 
@@ -281,21 +267,33 @@ def login():
         password = request.form['password']
         db = get_db()
         error = None
-        user = db.execute(
-            'SELECT * FROM user WHERE username = ?', (username,)
-        ).fetchone()
 
-        if user is None:
-            error = 'Incorrect username.'
-        elif not check_password_hash(user['password'], password):
-            error = 'Incorrect password.'
+        try:
+            client_throttle().check(request.remote_addr)
+            account_throttle().check(username)
+            client_throttle().hit(request.remote_addr)
+
+            user = db.execute(
+                'SELECT * FROM user WHERE username = ?', (username,)
+            ).fetchone()
+
+            if user is None:
+                error = 'Incorrect username.'
+            elif not user['password'] or not get_hasher().verify(user['password'], password):
+                error = 'Incorrect password.'
+        except (Throttled, Saturated) as e:
+            return busy_response(e)
 
         if error is not None:
+            account_throttle().hit(username)
             return jsonify({
                 "success": False,
                 "error": error
             }), 401
 
+        account_throttle().reset(username)
+        get_user_cache().put(user['id'], dict(user))
+
         session.clear()
         session['user_id'] = user['id']
 
@@ -323,9 +321,15 @@ def load_logged_in_user():
     if user_id is None:
         g.user = None
     else:
-        g.user = get_db().execute(
-            'SELECT * FROM user WHERE id = ?', (user_id,)
-        ).fetchone()
+        users = get_user_cache()
+        g.user = users.get(user_id)
+        if g.user is None:
+            user = get_db().execute(
+                'SELECT * FROM user WHERE id = ?', (user_id,)
+            ).fetchone()
+            g.user = dict(user) if user is not None else None
+            if g.user is not None:
+                users.put(user_id, g.user)
 
 
 @bp.route('/logout')
@@ -354,21 +358,15 @@ def login_required(view):
 @bp.route('/profile/<int:user_id>')
 @bp.route('/profile', defaults={'user_id': None})
 @login_required
+@conditional(lambda user_id=None: f"user:{user_id or g.user['id']}")
 def profile(user_id=None):
     """Get user profile"""
     if user_id is None:
         user_id = g.user['id']
 
     db = get_db()
-    user = db.execute(
-        'SELECT u.*, COUNT(DISTINCT p.id) as post_count, COUNT(DISTINCT c.id) as comment_count'
-        ' FROM user u'
-        ' LEFT JOIN post p ON u.id = p.author_id'
-        ' LEFT JOIN comment c ON u.id = c.author_id'
-        ' WHERE u.id = ?'
-        ' GROUP BY u.id',
-        (user_id,)
-    ).fetchone()
+    # post_count and comment_count are kept current by triggers (see db.counter_triggers)
+    user = db.execute('SELECT * FROM user WHERE id = ?', (user_id,)).fetchone()
 
     if user is None:
         return jsonify({
@@ -379,18 +377,35 @@ def profile(user_id=None):
     # Convert SQLite Row to dictionary
     user_dict = dict(user)
 
+    profile_image_set = None
+    if user_dict.get('profile_image'):
+        image = db.execute(
+            'SELECT width, height, variants FROM image WHERE url = ?',
+            (user_dict['profile_image'],)
+        ).fetchone()
+        profile_image_set = image_set(
+            user_dict['profile_image'],
+            *(tuple(image) if image else (None, None, None))
+        )
+
     return jsonify({
         "success": True,
         "user": {
             "id": user_dict['id'],
             "username": user_dict['username'],
             "email": user_dict['email'],
-            "bio": user_dict.get('bio'),
+            "bio": user_dict.get('about'),
             "profile_image": user_dict.get('profile_image'),
+            "profile_image_set": profile_image_set,
             "social_media": {
                 "twitter": user_dict.get('twitter_handle'),
                 "instagram": user_dict.get('instagram_handle'),
-                "linkedin": user_dict.get('linkedin_url')
+                "linkedin": user_dict.get('linkedin_url'),
+                "verification": {
+                    "twitter": user_dict.get('twitter_status'),
+                    "instagram": user_dict.get('instagram_status'),
+                    "linkedin": user_dict.get('linkedin_status')
+                }
             },
             "stats": {
                 "posts": user_dict['post_count'],
@@ -412,11 +427,13 @@ def edit_profile():
         
         error = None
         validator = SocialMediaValidator()
+        twitter = validator.clean_handle(twitter, 'twitter')
+        instagram = validator.clean_handle(instagram, 'instagram')
 
-        # Validate social media handles
-        if twitter and not validator.validate_twitter(validator.clean_handle(twitter, 'twitter')):
+        # Validate social media handles; whether they exist is checked in the background
+        if twitter and not validator.validate_twitter(twitter):
             error = 'Invalid Twitter handle'
-        if instagram and not validator.validate_instagram(validator.clean_handle(instagram, 'instagram')):
+        if instagram and not validator.validate_instagram(instagram):
             error = 'Invalid Instagram handle'
         if linkedin and not validator.validate_linkedin_url(linkedin):
             error = 'Invalid LinkedIn URL'
@@ -434,27 +451,30 @@ def edit_profile():
             if 'profile_image' in request.files:
                 file = request.files['profile_image']
                 if file and file.filename and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    upload_folder = os.path.join(current_app.static_folder, UPLOAD_FOLDER)
-                    os.makedirs(upload_folder, exist_ok=True)
-                    file_path = os.path.join(upload_folder, filename)
-                    file.save(file_path)
-                    profile_image = os.path.join(UPLOAD_FOLDER, filename)
+                    profile_image = store_upload(db, file, PROFILE_FOLDER)
 
             # Update user profile
             if profile_image:
                 db.execute(
-                    'UPDATE user SET bio = ?, twitter_handle = ?, instagram_handle = ?, '
+                    'UPDATE user SET about = ?, twitter_handle = ?, instagram_handle = ?, '
                     'linkedin_url = ?, profile_image = ? WHERE id = ?',
                     (bio, twitter, instagram, linkedin, profile_image, g.user['id'])
                 )
             else:
                 db.execute(
-                    'UPDATE user SET bio = ?, twitter_handle = ?, instagram_handle = ?, '
+                    'UPDATE user SET about = ?, twitter_handle = ?, instagram_handle = ?, '
                     'linkedin_url = ? WHERE id = ?',
                     (bio, twitter, instagram, linkedin, g.user['id'])
                 )
+            verification, pending = refresh_statuses(
+                db, g.user['id'], {'twitter': twitter, 'instagram': instagram, 'linkedin': linkedin}
+            )
             db.commit()
+            invalidate(f"user:{g.user['id']}")
+            forget_user(g.user['id'])
+            verify_later(pending)
+            if profile_image and g.user['profile_image'] not in (None, profile_image):
+                release_images(db, [g.user['profile_image']])
 
             return jsonify({
                 "success": True,
@@ -464,10 +484,17 @@ def edit_profile():
                     "twitter": twitter,
                     "instagram": instagram,
                     "linkedin": linkedin,
+                    "verification": verification,
                     "profile_image": profile_image
                 }
             })
 
+        except InvalidImage as e:
+            db.rollback()
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
         except Exception as e:
             db.rollback()
             return jsonify({
@@ -2,15 +2,29 @@ from flask import(
     Blueprint, flash, g, redirect, render_template, 
     request, url_for, current_app, jsonify
 )
+from markupsafe import escape
 from werkzeug.exceptions import abort
-from werkzeug.utils import secure_filename
 from Blog.auth import login_required
-from Blog.db import get_db
+from Blog.db import get_db, init_db, close_db, discard_db
+from Blog.cache import invalidate
+from Blog.content import plain_text, sanitize, summarize
+from Blog.images import POST_FOLDER, InvalidImage, image_set, release_images, store_upload
+from Blog.versions import conditional
+import base64
+import json
 import os
-import bleach
+import re
+import shutil
+import tempfile
+import time
+import click
 
 bp = Blueprint('blog', __name__)
 
+# Private-use characters FTS5 wraps matches in; swapped for <mark> once the text is escaped
+MARK_OPEN = '\ue000'
+MARK_CLOSE = '\ue001'
+
 # Helper functions
 def allowed_file(filename):
     """Check if a filename has an allowed extension."""
@@ -18,25 +32,139 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in {'png', 'jpg', 'jpeg', 'gif'}
 
 
-def get_post_comments(post_id):
-    """Get all comments for a specific post ordered by creation date."""
-    db = get_db()
-    comments = db.execute(
-        'SELECT c.id, c.body, c.created, c.author_id, u.username, p.author_id as post_author_id'
+def encode_cursor(created, id):
+    """Encode a (created, id) position as an opaque cursor string."""
+    raw = json.dumps([created, id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor, aborting with 400 if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created, id = json.loads(raw)
+        if not isinstance(created, str) or not isinstance(id, int):
+            raise ValueError(cursor)
+    except (ValueError, TypeError):
+        abort(400, "Invalid cursor.")
+    return created, id
+
+
+def page_size():
+    """Page size from the limit query argument, clamped to the configured maximum."""
+    limit = request.args.get('limit', current_app.config['PAGE_SIZE'], type=int)
+    return max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+
+
+def paginate(db, sql, conditions, params, cursor, limit, order_by):
+    """
+    Run a keyset-paginated query ordered newest first on order_by = (created, id).
+
+    sql is the SELECT ... FROM part, without a WHERE clause, and must select a
+    created_key column holding the raw created text. conditions are SQL expressions
+    ANDed into the WHERE clause, with params their placeholder values. Returns the
+    rows of the page and the cursor for the next one.
+    """
+    created_col, id_col = order_by
+    conditions = list(conditions)
+    if cursor:
+        conditions.append(f'({created_col}, {id_col}) < (?, ?)')
+        params = (*params, *decode_cursor(cursor))
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += f' ORDER BY {created_col} DESC, {id_col} DESC LIMIT ?'
+
+    rows = [dict(row) for row in db.execute(sql, (*params, limit + 1)).fetchall()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_key'], rows[-1]['id'])
+    for row in rows:
+        del row['created_key']
+    return rows, next_cursor
+
+
+def get_post_comments(post_id, cursor=None, limit=None):
+    """Get a page of comments for a specific post, newest first."""
+    return paginate(
+        get_db(),
+        'SELECT c.id, c.body, c.created, c.author_id, u.username, p.author_id as post_author_id,'
+        ' CAST(c.created AS TEXT) AS created_key'
         ' FROM comment c'
         ' JOIN user u ON c.author_id = u.id'
-        ' JOIN post p ON c.post_id = p.id'
-        ' WHERE c.post_id = ?'
-        ' ORDER BY c.created DESC',
-        (post_id,)
+        ' JOIN post p ON c.post_id = p.id',
+        ['c.post_id = ?'], (post_id,), cursor, limit or page_size(), ('c.created', 'c.id')
+    )
+
+
+def attach_post_details(db, posts):
+    """Attach images (with their resized variants) and comment counts to each post dict with batched lookups."""
+    by_id = {post['id']: post for post in posts}
+    for post in posts:
+        post['images'] = []
+        post['image_sets'] = []
+        post['comment_count'] = 0
+
+    if by_id:
+        # Ids are passed as one JSON array so each lookup is a single query for any page size
+        ids = json.dumps(list(by_id))
+        rows = db.execute(
+            'SELECT pi.post_id, pi.image_url, i.width, i.height, i.variants'
+            ' FROM post_images pi LEFT JOIN image i ON i.url = pi.image_url'
+            ' WHERE pi.post_id IN (SELECT value FROM json_each(?))'
+            ' ORDER BY pi.post_id, pi.id',
+            (ids,)
+        ).fetchall()
+        for row in rows:
+            post = by_id[row['post_id']]
+            post['images'].append(row['image_url'])
+            post['image_sets'].append(
+                image_set(row['image_url'], row['width'], row['height'], row['variants'])
+            )
+
+        rows = db.execute(
+            'SELECT post_id, COUNT(*) AS comment_count FROM comment'
+            ' WHERE post_id IN (SELECT value FROM json_each(?))'
+            ' GROUP BY post_id',
+            (ids,)
+        ).fetchall()
+        for row in rows:
+            by_id[row['post_id']]['comment_count'] = row['comment_count']
+
+    return posts
+
+
+def list_posts(db, limit, cursor=None, author_id=None):
+    """
+    Get a page of posts with their images and comment counts in a constant number of queries.
+
+    The page is picked from the (created, id) indexes alone, which cover the keyset
+    query, and only the posts on it are then read in full.
+    """
+    conditions, params = [], ()
+    if author_id is not None:
+        conditions, params = ['author_id = ?'], (author_id,)
+    page, next_cursor = paginate(
+        db, 'SELECT id, CAST(created AS TEXT) AS created_key FROM post',
+        conditions, params, cursor, limit, ('created', 'id')
+    )
+
+    rows = db.execute(
+        'SELECT p.id, title, excerpt, word_count, created, author_id, username'
+        ' FROM post p JOIN user u ON p.author_id = u.id'
+        ' WHERE p.id IN (SELECT value FROM json_each(?))',
+        (json.dumps([row['id'] for row in page]),)
     ).fetchall()
-    return [dict(comment) for comment in comments]
+    by_id = {row['id']: dict(row) for row in rows}
+    posts = [by_id[row['id']] for row in page if row['id'] in by_id]
+    return attach_post_details(db, posts), next_cursor
 
 
 def get_post(id, check_author=True):
     """Get a post and its images by id."""
-    post = get_db().execute(
-        'SELECT p.id, p.title, p.body, p.created, p.author_id, u.username'
+    db = get_db()
+    post = db.execute(
+        'SELECT p.id, p.title, p.body, p.excerpt, p.word_count, p.created, p.author_id, u.username'
         ' FROM post p'
         ' JOIN user u ON p.author_id = u.id'
         ' WHERE p.id = ?',
@@ -49,57 +177,161 @@ def get_post(id, check_author=True):
     if check_author and post['author_id'] != g.user['id']:
         abort(403)
 
-    # Convert to dictionary and fetch images
-    post_dict = dict(post)
-    post_dict['images'] = [
-        img['image_url'] for img in 
-        get_db().execute(
-            'SELECT image_url FROM post_images WHERE post_id = ?', 
-            (post_dict['id'],)
-        ).fetchall()
-    ]
-
-    return post_dict
+    # Convert to dictionary and fetch images and comment count
+    return attach_post_details(db, [dict(post)])[0]
 
 
 # Route handlers
 @bp.route('/')
+@conditional('feed', 'users')
 def index():
-    db = get_db()
-    posts = db.execute(
-        'SELECT p.id, title, body, created, author_id, username'
-        ' FROM post p JOIN user u ON p.author_id = u.id'
-        ' ORDER BY created DESC'
-    ).fetchall()
-    
-    # Fetch images for each post
-    posts_with_images = []
-    for post in posts:
-        post_dict = dict(post)
-        post_dict['images'] = [
-            img['image_url'] for img in 
-            db.execute('SELECT image_url FROM post_images WHERE post_id = ?', 
-                      (post_dict['id'],)).fetchall()
-        ]
-        posts_with_images.append(post_dict)
+    posts_with_images, next_cursor = list_posts(
+        get_db(), page_size(), request.args.get('cursor')
+    )
     
     return jsonify({
         "success": True,
-        "posts": posts_with_images
+        "posts": posts_with_images,
+        "next_cursor": next_cursor
+    })
+
+
+@bp.route('/user/<int:author_id>/posts')
+@conditional('feed', 'users')
+def author_posts(author_id):
+    posts_with_images, next_cursor = list_posts(
+        get_db(), page_size(), request.args.get('cursor'), author_id=author_id
+    )
+
+    return jsonify({
+        "success": True,
+        "posts": posts_with_images,
+        "next_cursor": next_cursor
     })
 
 
 @bp.route('/<int:id>/view')
+@conditional('post:{id}', 'users')
 def view(id):
     post = get_post(id, check_author=False)
-    comments = get_post_comments(id)
+    comments, next_cursor = get_post_comments(id)
     return jsonify({
         "success": True,
         "post": post,
-        "comments": comments
+        "comments": comments,
+        "comments_next_cursor": next_cursor
     })
 
 
+@bp.route('/<int:id>/comments')
+@conditional('post:{id}', 'users')
+def comments(id):
+    if get_db().execute('SELECT 1 FROM post WHERE id = ?', (id,)).fetchone() is None:
+        abort(404, f"Post id {id} doesn't exist.")
+    comments, next_cursor = get_post_comments(id, request.args.get('cursor'))
+    return jsonify({
+        "success": True,
+        "comments": comments,
+        "next_cursor": next_cursor
+    })
+
+
+def fts_query(q):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix."""
+    terms = re.findall(r'\w+', q)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+
+
+def render_highlight(text):
+    """Escape highlight()/snippet() output and turn its match markers into <mark> tags."""
+    if text is None:
+        return None
+    text = str(escape(text))
+    return text.replace(MARK_OPEN, '<mark>').replace(MARK_CLOSE, '</mark>')
+
+
+def search_posts(db, match, limit, offset):
+    """Posts matching an FTS5 query, best first, with highlighted title and body snippet."""
+    rows = db.execute(
+        'SELECT p.id, p.title, p.created, p.author_id, u.username,'
+        ' highlight(post_fts, 0, :open, :close) AS title_highlight,'
+        " snippet(post_fts, 1, :open, :close, '…', 24) AS snippet"
+        ' FROM post_fts'
+        ' JOIN post p ON p.id = post_fts.rowid'
+        ' JOIN user u ON p.author_id = u.id'
+        ' WHERE post_fts MATCH :match'
+        ' ORDER BY rank LIMIT :limit OFFSET :offset',
+        {"open": MARK_OPEN, "close": MARK_CLOSE, "match": match, "limit": limit, "offset": offset}
+    ).fetchall()
+    posts = []
+    for row in rows:
+        post = dict(row)
+        post['title_highlight'] = render_highlight(post['title_highlight'])
+        post['snippet'] = render_highlight(post['snippet'])
+        posts.append(post)
+    return posts
+
+
+def search_comments(db, match, limit, offset):
+    """Comments matching an FTS5 query, best first, with a highlighted snippet."""
+    rows = db.execute(
+        'SELECT c.id, c.post_id, c.created, c.author_id, u.username,'
+        " snippet(comment_fts, 0, :open, :close, '…', 24) AS snippet"
+        ' FROM comment_fts'
+        ' JOIN comment c ON c.id = comment_fts.rowid'
+        ' JOIN user u ON c.author_id = u.id'
+        ' WHERE comment_fts MATCH :match'
+        ' ORDER BY rank LIMIT :limit OFFSET :offset',
+        {"open": MARK_OPEN, "close": MARK_CLOSE, "match": match, "limit": limit, "offset": offset}
+    ).fetchall()
+    comments = []
+    for row in rows:
+        comment = dict(row)
+        comment['snippet'] = render_highlight(comment['snippet'])
+        comments.append(comment)
+    return comments
+
+
+@bp.route('/search')
+def search():
+    q = request.args.get('q', '').strip()
+    scope = request.args.get('scope', 'posts')
+    page = max(1, request.args.get('page', 1, type=int))
+
+    match = fts_query(q)
+    if match is None:
+        return jsonify({
+            "success": False,
+            "error": "Search query is required"
+        }), 400
+    if scope not in ('posts', 'comments', 'all'):
+        return jsonify({
+            "success": False,
+            "error": "scope must be posts, comments or all"
+        }), 400
+
+    db = get_db()
+    limit = page_size()
+    offset = (page - 1) * limit
+    result = {"success": True, "query": q, "page": page}
+    has_more = False
+
+    # Fetch one extra row per kind to know whether another page exists
+    if scope in ('posts', 'all'):
+        posts = search_posts(db, match, limit + 1, offset)
+        has_more = has_more or len(posts) > limit
+        result["posts"] = posts[:limit]
+    if scope in ('comments', 'all'):
+        comments = search_comments(db, match, limit + 1, offset)
+        has_more = has_more or len(comments) > limit
+        result["comments"] = comments[:limit]
+
+    result["next_page"] = page + 1 if has_more else None
+    return jsonify(result)
+
+
 @bp.route('/create', methods=('GET', 'POST'))
 @login_required
 def create():
@@ -118,51 +350,37 @@ def create():
             }), 400
 
         # Sanitize HTML content while allowing specific tags
-        allowed_tags = [
-            'p', 'h1', 'h2', 'strong', 'em', 'u', 'blockquote', 
-            'code', 'pre', 'ol', 'ul', 'li', 'a'
-        ]
-        allowed_attrs = {
-            'a': ['href', 'title'],
-            '*': ['class']
-        }
-        clean_body = bleach.clean(
-            body,
-            tags=allowed_tags,
-            attributes=allowed_attrs,
-            strip=True
-        )
+        clean_body = sanitize(body)
+        excerpt, word_count = summarize(clean_body)
+        body_text = plain_text(clean_body)
 
         db = get_db()
         try:
             # Insert post
             cursor = db.execute(
-                'INSERT INTO post (title, body, author_id)'
-                ' VALUES (?, ?, ?)',
-                (title, clean_body, g.user['id'])
+                'INSERT INTO post (title, body, body_text, excerpt, word_count, author_id)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (title, clean_body, body_text, excerpt, word_count, g.user['id'])
             )
             post_id = cursor.lastrowid
 
             # Handle multiple image uploads
             images = request.files.getlist('images')
-            upload_folder = os.path.join(current_app.static_folder, 'uploads')
-            os.makedirs(upload_folder, exist_ok=True)
             uploaded_images = []
 
             for file in images:
                 if file and file.filename and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    file_path = os.path.join(upload_folder, filename)
-                    file.save(file_path)
-                    
+                    image_url = store_upload(db, file, POST_FOLDER)
+
                     # Save image path to database
                     db.execute(
                         'INSERT INTO post_images (post_id, image_url) VALUES (?, ?)',
-                        (post_id, f'uploads/{filename}')
+                        (post_id, image_url)
                     )
-                    uploaded_images.append(f'uploads/{filename}')
+                    uploaded_images.append(image_url)
 
             db.commit()
+            invalidate('feed', f"user:{g.user['id']}")
             
             return jsonify({
                 "success": True,
@@ -171,6 +389,12 @@ def create():
                 "uploaded_images": uploaded_images
             })
 
+        except InvalidImage as e:
+            db.rollback()
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
         except Exception as e:
             db.rollback()
             return jsonify({
@@ -203,35 +427,36 @@ def update(id):
                 "error": error
             }), 400
 
+        clean_body = sanitize(body)
+        excerpt, word_count = summarize(clean_body)
+        body_text = plain_text(clean_body)
+
         db = get_db()
         try:
-            # Handle image removal
-            removed_images = request.form.getlist('remove_images')
-            for img in removed_images:
-                # Remove from filesystem
-                img_path = os.path.join(current_app.static_folder, img)
-                if os.path.exists(img_path):
-                    os.remove(img_path)
-                
-                # Remove from database
-                db.execute('DELETE FROM post_images WHERE image_url = ?', (img,))
+            # Handle image removal; files go once nothing else references them
+            # Only URLs actually attached to this post are candidates for deletion
+            removed_images = []
+            for img in request.form.getlist('remove_images'):
+                cursor = db.execute(
+                    'DELETE FROM post_images WHERE image_url = ? AND post_id = ?',
+                    (img, id)
+                )
+                if cursor.rowcount > 0:
+                    removed_images.append(img)
 
             # Handle new image uploads
             uploaded_images = []
             for file in request.files.getlist('images'):
                 if file and file.filename:
                     if allowed_file(file.filename):
-                        filename = secure_filename(file.filename)
-                        os.makedirs(os.path.join(current_app.static_folder, 'uploads'), exist_ok=True)
-                        file_path = os.path.join(current_app.static_folder, 'uploads', filename)
-                        file.save(file_path)
-                        
+                        image_url = store_upload(db, file, POST_FOLDER)
+
                         # Save image path to database
                         db.execute(
                             'INSERT INTO post_images (post_id, image_url) VALUES (?, ?)',
-                            (id, f'uploads/{filename}')
+                            (id, image_url)
                         )
-                        uploaded_images.append(f'uploads/{filename}')
+                        uploaded_images.append(image_url)
                     else:
                         return jsonify({
                             "success": False,
@@ -240,11 +465,13 @@ def update(id):
 
             # Update post details
             db.execute(
-                'UPDATE post SET title = ?, body = ?'
+                'UPDATE post SET title = ?, body = ?, body_text = ?, excerpt = ?, word_count = ?'
                 ' WHERE id = ?',
-                (title, body, id)
+                (title, clean_body, body_text, excerpt, word_count, id)
             )
             db.commit()
+            invalidate('feed', f'post:{id}')
+            release_images(db, removed_images)
 
             return jsonify({
                 "success": True,
@@ -253,6 +480,12 @@ def update(id):
                 "uploaded_images": uploaded_images
             })
 
+        except InvalidImage as e:
+            db.rollback()
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
         except Exception as e:
             db.rollback()
             return jsonify({
@@ -274,19 +507,14 @@ def delete(id):
     db = get_db()
     
     try:
-        # Delete physical image files
-        for image_url in post['images']:
-            try:
-                image_path = os.path.join(current_app.static_folder, image_url)
-                if os.path.exists(image_path):
-                    os.remove(image_path)
-            except Exception as e:
-                print(f"Error deleting image file: {e}")
-        
         # Delete image records and post from database
         db.execute('DELETE FROM post_images WHERE post_id = ?', (id,))
         db.execute('DELETE FROM post WHERE id = ?', (id,))
         db.commit()
+        invalidate('feed', f'post:{id}', f"user:{post['author_id']}")
+
+        # Delete image files no other post or profile still uses
+        release_images(db, post['images'])
         
         return jsonify({
             "success": True,
@@ -332,6 +560,7 @@ def add_comment(post_id):
         )
         comment_id = cursor.lastrowid
         db.commit()
+        invalidate('feed', f'post:{post_id}', f"user:{g.user['id']}")
 
         return jsonify({
             "success": True,
@@ -374,6 +603,7 @@ def delete_comment(id):
 
         db.execute('DELETE FROM comment WHERE id = ?', (id,))
         db.commit()
+        invalidate('feed', f"post:{comment['post_id']}", f"user:{comment['author_id']}")
 
         return jsonify({
             "success": True,
@@ -386,3 +616,62 @@ def delete_comment(id):
             "success": False,
             "error": f"Error deleting comment: {str(e)}"
         }), 500
+
+
+@bp.cli.command('bench-feed')
+@click.option('--posts', default=10000, help='Number of synthetic posts')
+@click.option('--runs', default=5, help='Timed runs of the feed query')
+def bench_feed_command(posts, runs):
+    """Time the feed listing against a throwaway database of synthetic posts."""
+    original_database = current_app.config['DATABASE']
+    workdir = tempfile.mkdtemp()
+    current_app.config['DATABASE'] = os.path.join(workdir, 'bench.sqlite')
+    close_db()
+
+    try:
+        init_db()
+        db = get_db()
+        db.executemany(
+            'INSERT INTO user (email, username, password) VALUES (?, ?, ?)',
+            [(f'user{i}@example.com', f'user{i}', 'x') for i in range(100)]
+        )
+        db.executemany(
+            'INSERT INTO post (author_id, title, body) VALUES (?, ?, ?)',
+            [(i % 100 + 1, f'Post {i}', 'Lorem ipsum ' * 50) for i in range(posts)]
+        )
+        db.executemany(
+            'INSERT INTO post_images (post_id, image_url) VALUES (?, ?)',
+            [(i % posts + 1, f'uploads/img{i}.jpg') for i in range(posts * 2)]
+        )
+        db.executemany(
+            'INSERT INTO comment (post_id, author_id, body) VALUES (?, ?, ?)',
+            [(i % posts + 1, i % 100 + 1, 'Nice post') for i in range(posts * 3)]
+        )
+        db.commit()
+
+        # A cursor near the end of the feed, to compare deep pages with the first one
+        deep = db.execute(
+            'SELECT CAST(created AS TEXT), id FROM post ORDER BY created, id LIMIT 1 OFFSET ?',
+            (current_app.config['PAGE_SIZE'],)
+        ).fetchone()
+        pages = {'first page': None, 'deep page': encode_cursor(deep[0], deep[1])}
+
+        for label, cursor in pages.items():
+            statements = []
+            db.set_trace_callback(statements.append)
+            timings = []
+            for _ in range(runs):
+                statements.clear()
+                start = time.perf_counter()
+                result, _ = list_posts(db, current_app.config['PAGE_SIZE'], cursor)
+                timings.append(time.perf_counter() - start)
+            db.set_trace_callback(None)
+
+            click.echo(
+                f'{label}: {len(result)} posts, {len(statements)} queries,'
+                f' best {min(timings) * 1000:.2f} ms, mean {sum(timings) / runs * 1000:.2f} ms'
+            )
+    finally:
+        discard_db()
+        current_app.config['DATABASE'] = original_database
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+class ResponseCache:
+    """
+    In-process cache of rendered JSON responses, bounded by total body size.
+
+    Entries are tagged with the data_version scopes they depend on. Write paths
+    drop them with invalidate(), and every lookup also checks the stored ETag so
+    writes made by other processes are never served stale.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (etag, last_modified, mimetype, body, scopes)
+        self._by_scope = {}             # scope -> set of keys
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, etag):
+        """Return (body, mimetype) cached for key at etag, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[3], entry[2]
+
+    def put(self, key, etag, last_modified, mimetype, body, scopes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (etag, last_modified, mimetype, body, scopes)
+            self._bytes += len(body)
+            for scope in scopes:
+                self._by_scope.setdefault(scope, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, *scopes):
+        """Drop every entry that depends on any of scopes."""
+        with self._lock:
+            for scope in scopes:
+                for key in self._by_scope.pop(scope, ()):
+                    if self._remove(key):
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_scope.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key):
+        # Caller must hold self._lock
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= len(entry[3])
+        for scope in entry[4]:
+            keys = self._by_scope.get(scope)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_scope[scope]
+        return True
+
+
+class UserCache:
+    """
+    Bounded, short-lived cache of user rows by id for load_logged_in_user.
+
+    Writers in this process call forget(); the TTL bounds how long a change made
+    by another process can go unseen.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # user id -> (expires_at, row dict)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def get_cache():
+    return current_app.extensions['response_cache']
+
+
+def get_user_cache():
+    return current_app.extensions['user_cache']
+
+
+def forget_user(*user_ids):
+    """Drop cached user rows; call after writing to them is committed."""
+    get_user_cache().forget(*user_ids)
+
+
+def invalidate(*scopes):
+    """Drop cached responses depending on scopes; call after the write is committed."""
+    get_cache().invalidate(*scopes)
+
+
+def init_app(app):
+    app.extensions['response_cache'] = ResponseCache(app.config['RESPONSE_CACHE_MAX_BYTES'])
+    app.extensions['user_cache'] = UserCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
@@ -0,0 +1,86 @@
+import html
+import re
+import threading
+from bleach.sanitizer import Cleaner
+
+# Tags and attributes allowed in post bodies
+ALLOWED_TAGS = [
+    'p', 'h1', 'h2', 'strong', 'em', 'u', 'blockquote',
+    'code', 'pre', 'ol', 'ul', 'li', 'a'
+]
+ALLOWED_ATTRS = {
+    'a': ['href', 'title'],
+    '*': ['class']
+}
+
+# Characters of plain text kept as a post's feed excerpt
+EXCERPT_LENGTH = 280
+
+# Cleaners build their parser and filters once, but are not thread-safe, so keep one per thread
+_local = threading.local()
+
+_TAG = re.compile(r'<[^>]*>')
+_SPACE = re.compile(r'\s+')
+
+
+def sanitize(body):
+    """Sanitize a post body down to the allowed HTML."""
+    cleaner = getattr(_local, 'cleaner', None)
+    if cleaner is None:
+        cleaner = _local.cleaner = Cleaner(tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS, strip=True)
+    return cleaner.clean(body)
+
+
+def plain_text(clean_body):
+    """The visible text of a sanitized post body, as stored for search."""
+    return _SPACE.sub(' ', html.unescape(_TAG.sub(' ', clean_body))).strip()
+
+
+def summarize(clean_body):
+    """Return (excerpt, word_count) for a sanitized post body."""
+    text = plain_text(clean_body)
+    words = text.split(' ') if text else []
+
+    excerpt = text
+    if len(text) > EXCERPT_LENGTH:
+        excerpt = text[:EXCERPT_LENGTH].rsplit(' ', 1)[0] + '…'
+    return excerpt, len(words)
+
+
+def backfill_post_summaries(db, batch_size=500):
+    """Sanitize stored post bodies and fill in their excerpts and word counts."""
+    last_id = 0
+    while True:
+        rows = db.execute(
+            'SELECT id, body FROM post WHERE id > ? ORDER BY id LIMIT ?',
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for id, body in rows:
+            clean_body = sanitize(body)
+            updates.append((clean_body, *summarize(clean_body), id))
+        db.executemany(
+            'UPDATE post SET body = ?, excerpt = ?, word_count = ? WHERE id = ?', updates
+        )
+        last_id = rows[-1][0]
+
+
+def backfill_post_text(db, batch_size=500):
+    """Fill in the plain text of stored post bodies."""
+    last_id = 0
+    while True:
+        rows = db.execute(
+            'SELECT id, body FROM post WHERE id > ? ORDER BY id LIMIT ?',
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+
+        db.executemany(
+            'UPDATE post SET body_text = ? WHERE id = ?',
+            [(plain_text(body), id) for id, body in rows]
+        )
+        last_id = rows[-1][0]
@@ -1,46 +1,315 @@
+import os
+import re
+import shutil
 import sqlite3
-from datetime import datetime 
+import tempfile
+import threading
+from datetime import datetime
 import click
-from flask import current_app, g 
+from flask import current_app, g
+from Blog.content import backfill_post_summaries, backfill_post_text
+
+
+def version_trigger(name, event, *scopes):
+    """Trigger bumping the data_version counter of each scope expression on event."""
+    bumps = ''.join(
+        f' INSERT INTO data_version (scope, version, modified) VALUES ({scope}, 1, CURRENT_TIMESTAMP)'
+        ' ON CONFLICT (scope) DO UPDATE SET version = version + 1, modified = CURRENT_TIMESTAMP;'
+        for scope in scopes
+    )
+    return f'CREATE TRIGGER IF NOT EXISTS version_{name} {event} BEGIN{bumps} END'
+
+def counter_triggers(table, column):
+    """Triggers keeping user.<column> equal to the number of table rows each user authored."""
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS user_{column}_insert AFTER INSERT ON {table} BEGIN'
+        f' UPDATE user SET {column} = {column} + 1 WHERE id = new.author_id;'
+        ' END',
+        f'CREATE TRIGGER IF NOT EXISTS user_{column}_delete AFTER DELETE ON {table} BEGIN'
+        f' UPDATE user SET {column} = {column} - 1 WHERE id = old.author_id;'
+        ' END',
+        f'CREATE TRIGGER IF NOT EXISTS user_{column}_move AFTER UPDATE OF author_id ON {table}'
+        ' WHEN old.author_id IS NOT new.author_id BEGIN'
+        f' UPDATE user SET {column} = {column} - 1 WHERE id = old.author_id;'
+        f' UPDATE user SET {column} = {column} + 1 WHERE id = new.author_id;'
+        ' END',
+    ]
+
+def recount_user_stats(db):
+    """Recompute every user's post and comment counters. Returns the number of users corrected."""
+    cursor = db.execute(
+        'UPDATE user SET'
+        ' post_count = (SELECT COUNT(*) FROM post WHERE post.author_id = user.id),'
+        ' comment_count = (SELECT COUNT(*) FROM comment WHERE comment.author_id = user.id)'
+        ' WHERE post_count IS NOT (SELECT COUNT(*) FROM post WHERE post.author_id = user.id)'
+        ' OR comment_count IS NOT (SELECT COUNT(*) FROM comment WHERE comment.author_id = user.id)'
+    )
+    return cursor.rowcount
+
+# Versioned schema changes applied on top of schema.sql, tracked in PRAGMA user_version.
+# Each entry is (version, description, steps); a step is a SQL statement or a callable
+# taking the connection, for data changes that are easier to express in Python.
+MIGRATIONS = [
+    (1, 'indexes for feed, comment, image and profile lookups', [
+        'CREATE INDEX IF NOT EXISTS idx_post_created ON post (created, id)',
+        'CREATE INDEX IF NOT EXISTS idx_post_author_created ON post (author_id, created, id)',
+        'CREATE INDEX IF NOT EXISTS idx_post_images_post ON post_images (post_id)',
+        'CREATE INDEX IF NOT EXISTS idx_post_images_url ON post_images (image_url)',
+        'CREATE INDEX IF NOT EXISTS idx_comment_post_created ON comment (post_id, created, id)',
+        'CREATE INDEX IF NOT EXISTS idx_comment_author ON comment (author_id)',
+    ]),
+    (2, 'full-text search over posts and comments', [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5("
+        " title, body, content='post', content_rowid='id', tokenize='porter unicode61')",
+        'CREATE TRIGGER IF NOT EXISTS post_fts_insert AFTER INSERT ON post BEGIN'
+        ' INSERT INTO post_fts (rowid, title, body) VALUES (new.id, new.title, new.body);'
+        ' END',
+        'CREATE TRIGGER IF NOT EXISTS post_fts_delete AFTER DELETE ON post BEGIN'
+        " INSERT INTO post_fts (post_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);"
+        ' END',
+        'CREATE TRIGGER IF NOT EXISTS post_fts_update AFTER UPDATE OF title, body ON post BEGIN'
+        " INSERT INTO post_fts (post_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);"
+        ' INSERT INTO post_fts (rowid, title, body) VALUES (new.id, new.title, new.body);'
+        ' END',
+        "INSERT INTO post_fts (post_fts) VALUES ('rebuild')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS comment_fts USING fts5("
+        " body, content='comment', content_rowid='id', tokenize='porter unicode61')",
+        'CREATE TRIGGER IF NOT EXISTS comment_fts_insert AFTER INSERT ON comment BEGIN'
+        ' INSERT INTO comment_fts (rowid, body) VALUES (new.id, new.body);'
+        ' END',
+        'CREATE TRIGGER IF NOT EXISTS comment_fts_delete AFTER DELETE ON comment BEGIN'
+        " INSERT INTO comment_fts (comment_fts, rowid, body) VALUES ('delete', old.id, old.body);"
+        ' END',
+        'CREATE TRIGGER IF NOT EXISTS comment_fts_update AFTER UPDATE OF body ON comment BEGIN'
+        " INSERT INTO comment_fts (comment_fts, rowid, body) VALUES ('delete', old.id, old.body);"
+        ' INSERT INTO comment_fts (rowid, body) VALUES (new.id, new.body);'
+        ' END',
+        "INSERT INTO comment_fts (comment_fts) VALUES ('rebuild')",
+    ]),
+    (3, 'data_version change counters for conditional responses', [
+        'CREATE TABLE IF NOT EXISTS data_version ('
+        ' scope TEXT PRIMARY KEY,'
+        ' version INTEGER NOT NULL,'
+        ' modified TIMESTAMP NOT NULL'
+        ')',
+        version_trigger('post_insert', 'AFTER INSERT ON post',
+                         "'feed'", "'post:' || new.id", "'user:' || new.author_id"),
+        version_trigger('post_update', 'AFTER UPDATE ON post',
+                         "'feed'", "'post:' || new.id"),
+        version_trigger('post_delete', 'AFTER DELETE ON post',
+                         "'feed'", "'post:' || old.id", "'user:' || old.author_id"),
+        version_trigger('post_images_insert', 'AFTER INSERT ON post_images',
+                         "'feed'", "'post:' || new.post_id"),
+        version_trigger('post_images_delete', 'AFTER DELETE ON post_images',
+                         "'feed'", "'post:' || old.post_id"),
+        version_trigger('comment_insert', 'AFTER INSERT ON comment',
+                         "'feed'", "'post:' || new.post_id", "'user:' || new.author_id"),
+        version_trigger('comment_update', 'AFTER UPDATE ON comment',
+                         "'post:' || new.post_id"),
+        version_trigger('comment_delete', 'AFTER DELETE ON comment',
+                         "'feed'", "'post:' || old.post_id", "'user:' || old.author_id"),
+        version_trigger('user_update', 'AFTER UPDATE ON user',
+                         "'user:' || new.id"),
+        # Usernames are shown on every post and comment
+        version_trigger('username_update', 'AFTER UPDATE OF username ON user',
+                         "'users'"),
+    ]),
+    (4, 'content-addressed images with resized variants', [
+        'CREATE TABLE IF NOT EXISTS image ('
+        ' url TEXT PRIMARY KEY,'
+        ' width INTEGER,'
+        ' height INTEGER,'
+        ' variants TEXT,'
+        ' created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP'
+        ')',
+        'CREATE INDEX IF NOT EXISTS idx_user_profile_image ON user (profile_image)',
+        # Variants finish in the background; refresh everything that shows the image
+        'CREATE TRIGGER IF NOT EXISTS version_image_variants AFTER UPDATE OF variants ON image BEGIN'
+        " INSERT INTO data_version (scope, version, modified)"
+        " SELECT 'post:' || post_id, 1, CURRENT_TIMESTAMP FROM post_images WHERE image_url = new.url"
+        ' ON CONFLICT (scope) DO UPDATE SET version = version + 1, modified = CURRENT_TIMESTAMP;'
+        " INSERT INTO data_version (scope, version, modified)"
+        " SELECT 'user:' || id, 1, CURRENT_TIMESTAMP FROM user WHERE profile_image = new.url"
+        ' ON CONFLICT (scope) DO UPDATE SET version = version + 1, modified = CURRENT_TIMESTAMP;'
+        " INSERT INTO data_version (scope, version, modified) VALUES ('feed', 1, CURRENT_TIMESTAMP)"
+        ' ON CONFLICT (scope) DO UPDATE SET version = version + 1, modified = CURRENT_TIMESTAMP;'
+        ' END',
+    ]),
+    (5, 'per-user post and comment counters for profile stats', [
+        'ALTER TABLE user ADD COLUMN post_count INTEGER NOT NULL DEFAULT 0',
+        'ALTER TABLE user ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0',
+        *counter_triggers('post', 'post_count'),
+        *counter_triggers('comment', 'comment_count'),
+        recount_user_stats,
+    ]),
+    (6, 'stored post excerpts and word counts, sanitized bodies', [
+        "ALTER TABLE post ADD COLUMN excerpt TEXT NOT NULL DEFAULT ''",
+        'ALTER TABLE post ADD COLUMN word_count INTEGER NOT NULL DEFAULT 0',
+        backfill_post_summaries,
+    ]),
+    (7, 'social handle verification cache and per-user statuses', [
+        'CREATE TABLE IF NOT EXISTS handle_check ('
+        ' platform TEXT NOT NULL,'
+        ' handle TEXT NOT NULL,'
+        ' status TEXT NOT NULL,'
+        ' checked TIMESTAMP NOT NULL,'
+        ' PRIMARY KEY (platform, handle)'
+        ')',
+        'ALTER TABLE user ADD COLUMN twitter_status TEXT',
+        'ALTER TABLE user ADD COLUMN instagram_status TEXT',
+        'ALTER TABLE user ADD COLUMN linkedin_status TEXT',
+        'CREATE INDEX IF NOT EXISTS idx_user_twitter ON user (twitter_handle)',
+        'CREATE INDEX IF NOT EXISTS idx_user_instagram ON user (instagram_handle)',
+        'CREATE INDEX IF NOT EXISTS idx_user_linkedin ON user (linkedin_url)',
+    ]),
+    (8, 'search posts by their visible text rather than their HTML', [
+        "ALTER TABLE post ADD COLUMN body_text TEXT NOT NULL DEFAULT ''",
+        backfill_post_text,
+        'DROP TRIGGER IF EXISTS post_fts_insert',
+        'DROP TRIGGER IF EXISTS post_fts_delete',
+        'DROP TRIGGER IF EXISTS post_fts_update',
+        'DROP TABLE IF EXISTS post_fts',
+        "CREATE VIRTUAL TABLE post_fts USING fts5("
+        " title, body_text, content='post', content_rowid='id', tokenize='porter unicode61')",
+        'CREATE TRIGGER post_fts_insert AFTER INSERT ON post BEGIN'
+        ' INSERT INTO post_fts (rowid, title, body_text) VALUES (new.id, new.title, new.body_text);'
+        ' END',
+        'CREATE TRIGGER post_fts_delete AFTER DELETE ON post BEGIN'
+        " INSERT INTO post_fts (post_fts, rowid, title, body_text) VALUES ('delete', old.id, old.title, old.body_text);"
+        ' END',
+        'CREATE TRIGGER post_fts_update AFTER UPDATE OF title, body_text ON post BEGIN'
+        " INSERT INTO post_fts (post_fts, rowid, title, body_text) VALUES ('delete', old.id, old.title, old.body_text);"
+        ' INSERT INTO post_fts (rowid, title, body_text) VALUES (new.id, new.title, new.body_text);'
+        ' END',
+        "INSERT INTO post_fts (post_fts) VALUES ('rebuild')",
+    ]),
+]
+
+
+# Connections kept open per thread and database path, reused across requests
+_local = threading.local()
+
+
+def connect(app):
+    """Open a connection to the app's database with the configured tuning applied."""
+    db = sqlite3.connect(
+            app.config['DATABASE'],
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            timeout=app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+            cached_statements=app.config['SQLITE_STATEMENT_CACHE'],
+            factory=app.config.get('SQLITE_CONNECTION_FACTORY') or sqlite3.Connection
+    )
+    db.row_factory = sqlite3.Row
+    if app.config['SQLITE_WAL']:
+        # Readers keep going while a writer commits
+        db.execute('PRAGMA journal_mode = WAL')
+    db.execute(f"PRAGMA synchronous = {app.config['SQLITE_SYNCHRONOUS']}")
+    db.execute(f"PRAGMA cache_size = -{int(app.config['SQLITE_CACHE_SIZE_KB'])}")
+    db.execute(f"PRAGMA mmap_size = {int(app.config['SQLITE_MMAP_SIZE'])}")
+    db.execute(f"PRAGMA busy_timeout = {int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    return db
 
 def get_db():
     if 'db' not in g:
-        g.db = sqlite3.connect(
-                current_app.config['DATABASE'],
-                detect_types=sqlite3.PARSE_DECLTYPES    
-        )
-        g.db.row_factory = sqlite3.Row
+        app = current_app._get_current_object()
+        if app.config['SQLITE_REUSE_CONNECTIONS']:
+            pool = getattr(_local, 'connections', None)
+            if pool is None:
+                pool = _local.connections = {}
+            key = app.config['DATABASE']
+            if key not in pool:
+                pool[key] = connect(app)
+            g.db = pool[key]
+        else:
+            g.db = connect(app)
+        g.db.set_trace_callback(app.config.get('SQL_TRACE'))
 
-    return g.db 
+    return g.db
 
 def close_db(e=None):
     db = g.pop('db', None)
 
+    if db is not None:
+        if current_app.config['SQLITE_REUSE_CONNECTIONS']:
+            # Hand the connection back clean for the next request on this thread
+            if db.in_transaction:
+                db.rollback()
+            db.set_trace_callback(None)
+        else:
+            db.close()
+
+def discard_db():
+    """Close this thread's connection to the current database instead of keeping it for reuse."""
+    close_db()
+    pool = getattr(_local, 'connections', {})
+    db = pool.pop(current_app.config['DATABASE'], None)
     if db is not None:
         db.close()
 
+def schema_version(db):
+    """Return the schema version recorded in the database."""
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(db):
+    """Apply pending migrations in order, each in its own transaction. Returns the versions applied."""
+    applied = []
+    current = schema_version(db)
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            db.execute('BEGIN')
+            for step in steps:
+                if callable(step):
+                    step(db)
+                else:
+                    db.execute(step)
+            db.execute(f'PRAGMA user_version = {int(version)}')
+            db.commit()
+        except Exception:
+            db.rollback()
+            current_app.logger.error(f"Migration {version} ({description}) failed")
+            raise
+        applied.append(version)
+    return applied
+
+def latest_version():
+    """The schema version a fully migrated database is at."""
+    return MIGRATIONS[-1][0]
+
+def migrate_on_startup(app):
+    """
+    Bring an existing database up to date before the app serves anything, so an old
+    file fails or upgrades here rather than with 500s on the first query that needs
+    a newer column. With MIGRATE_ON_STARTUP off, refuse to start instead.
+    Databases that don't exist or have no tables yet are left for init-db.
+    """
+    if not os.path.exists(app.config['DATABASE']):
+        return
+    with app.app_context():
+        db = get_db()
+        initialized = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'post'"
+        ).fetchone()
+        current = schema_version(db)
+        if not initialized or current >= latest_version():
+            return
+        if not app.config['MIGRATE_ON_STARTUP']:
+            raise RuntimeError(
+                f"Database is at schema version {current}, expected {latest_version()};"
+                " run 'flask migrate-db'"
+            )
+        applied = migrate(db)
+        app.logger.info(f"Applied migrations {', '.join(map(str, applied))}")
+
 def init_db():
     """Initialize the database with schema."""
     db = get_db()
-    
-    try:
-        with current_app.open_resource('schema.sql') as f:
-            # Execute schema in a transaction
-            script = f.read().decode('utf8')
-            # Split the script into individual statements
-            statements = script.split(';')
-            for statement in statements:
-                if statement.strip():  # Skip empty statements
-                    try:
-                        db.execute(statement)
-                    except sqlite3.OperationalError as e:
-                        # Log the error but continue with other statements
-                        current_app.logger.warning(f"Error executing statement: {e}")
-            db.commit()
-    except Exception as e:
-        db.rollback()  # Rollback in case of errors
-        current_app.logger.error(f"Database initialization failed: {e}")
-        raise
+
+    with current_app.open_resource('schema.sql') as f:
+        db.executescript(f.read().decode('utf8'))
+    db.execute('PRAGMA user_version = 0')
+    migrate(db)
 
 @click.command('init-db')
 @click.option('--force', is_flag=True, help='Force recreate all tables')
@@ -50,19 +319,145 @@ def init_db_command(force):
         # Drop all tables if force flag is used
         db = get_db()
         db.executescript('''
+            DROP TABLE IF EXISTS handle_check;
+            DROP TABLE IF EXISTS image;
+            DROP TABLE IF EXISTS data_version;
+            DROP TABLE IF EXISTS comment_fts;
+            DROP TABLE IF EXISTS post_fts;
+            DROP TABLE IF EXISTS comment;
             DROP TABLE IF EXISTS post_images;
             DROP TABLE IF EXISTS post;
             DROP TABLE IF EXISTS user;
         ''')
         db.commit()
-        
+
     init_db()
     click.echo('Initialized the database.')
 
+@click.command('migrate-db')
+def migrate_db_command():
+    """Apply pending schema migrations without touching existing data."""
+    applied = migrate(get_db())
+    if applied:
+        click.echo(f"Applied migrations {', '.join(map(str, applied))}.")
+    click.echo(f'Database is at schema version {schema_version(get_db())}.')
+
+@click.command('repair-user-stats')
+def repair_user_stats_command():
+    """Recount the per-user post and comment counters from the post and comment tables."""
+    db = get_db()
+    corrected = recount_user_stats(db)
+    db.commit()
+    click.echo(f'Corrected counters for {corrected} users.')
+
+# Covering indexes a hot query may walk in order, stopping at its LIMIT: the
+# unfiltered first feed page picks its post ids from idx_post_created
+ALLOWED_INDEX_SCANS = {'idx_post_created'}
+
+def plan_scans(db, sql, allowed=ALLOWED_INDEX_SCANS):
+    """
+    Return the EXPLAIN QUERY PLAN steps of sql that scan a whole table or index,
+    other than walks over one of the allowed covering indexes.
+    """
+    scans = []
+    for row in db.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall():
+        detail = row[3]
+        if not detail.startswith('SCAN ') or 'VIRTUAL TABLE' in detail or detail == 'SCAN CONSTANT ROW':
+            continue
+        covering = re.search(r'USING COVERING INDEX (\w+)', detail)
+        if covering and covering.group(1) in allowed:
+            continue
+        scans.append(detail)
+    return scans
+
+def hot_path_queries(app, client):
+    """
+    Make the requests behind the hot Blog endpoints as the logged-in user 1, who must
+    have post 1 and comment 1, and return the distinct queries they ran.
+    """
+    statements = []
+    app.config['SQL_TRACE'] = statements.append
+    try:
+        feed = client.get('/', query_string={'limit': 5}).get_json()
+        client.get('/', query_string={'limit': 5, 'cursor': feed['next_cursor']})
+        client.get('/user/1/posts', query_string={'limit': 5})
+        view = client.get('/1/view', query_string={'limit': 5}).get_json()
+        client.get('/1/comments', query_string={'limit': 5, 'cursor': view['comments_next_cursor']})
+        client.get('/auth/profile')
+        client.get('/search', query_string={'q': 'body comm', 'scope': 'all'})
+        client.post('/post/1/comment', data={'body': 'Hello'})
+        client.post('/comment/1/delete')
+        client.post('/1/update', data={'title': 'Post', 'body': 'Body', 'remove_images': 'uploads/missing.jpg'})
+        client.post('/1/delete')
+    finally:
+        app.config['SQL_TRACE'] = None
+    return [
+        sql for sql in dict.fromkeys(statements)
+        if sql.split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE')
+    ]
+
+@click.command('check-query-plans')
+def check_query_plans_command():
+    """Drive the hot Blog endpoints against a scratch database and fail if any query scans a table or index."""
+    workdir = tempfile.mkdtemp()
+    app = current_app._get_current_object()
+    original = {key: app.config.get(key) for key in ('DATABASE', 'SQL_TRACE')}
+    app.config['DATABASE'] = os.path.join(workdir, 'plans.sqlite')
+    close_db()
+
+    try:
+        init_db()
+        db = get_db()
+        db.executemany(
+            'INSERT INTO user (email, username, password) VALUES (?, ?, ?)',
+            [(f'user{i}@example.com', f'user{i}', 'x') for i in range(3)]
+        )
+        db.executemany(
+            'INSERT INTO post (author_id, title, body) VALUES (?, ?, ?)',
+            [(i % 3 + 1, f'Post {i}', 'Body') for i in range(30)]
+        )
+        db.executemany(
+            'INSERT INTO post_images (post_id, image_url) VALUES (?, ?)',
+            [(i + 1, f'uploads/check-query-plans-{i}.jpg') for i in range(30)]
+        )
+        db.executemany(
+            'INSERT INTO comment (post_id, author_id, body) VALUES (?, ?, ?)',
+            [(i % 30 + 1, i % 3 + 1, 'Comment') for i in range(90)]
+        )
+        db.commit()
+        close_db()
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = 1
+        # Only the endpoints' queries are checked, not schema setup and seeding
+        queries = hot_path_queries(app, client)
+
+        db = get_db()
+        failures = {}
+        for sql in queries:
+            scans = plan_scans(db, sql)
+            if scans:
+                failures[sql] = scans
+    finally:
+        discard_db()
+        app.config.update(original)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for sql, scans in failures.items():
+        click.echo(f"{sql}\n    -> {'; '.join(scans)}")
+    if failures:
+        raise click.ClickException(f'{len(failures)} hot queries scan a table or index.')
+    click.echo('No hot query scans a table or index.')
+
 sqlite3.register_converter(
     "timestamp", lambda v: datetime.fromisoformat(v.decode())
 )
 
 def init_app(app):
     app.teardown_appcontext(close_db)
+    migrate_on_startup(app)
     app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_db_command)
+    app.cli.add_command(repair_user_stats_command)
+    app.cli.add_command(check_query_plans_command)
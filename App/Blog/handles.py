@@ -0,0 +1,145 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from flask import current_app
+
+# Handle and verification status columns on user, by platform
+PLATFORMS = {
+    'twitter': ('twitter_handle', 'twitter_status'),
+    'instagram': ('instagram_handle', 'instagram_status'),
+    'linkedin': ('linkedin_url', 'linkedin_status'),
+}
+
+PENDING = 'pending'
+VERIFIED = 'verified'
+MISSING = 'missing'
+# The site could not be reached or would not say; checked again sooner
+UNKNOWN = 'unknown'
+
+_session = requests.Session()
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def _executor(app):
+    executor = app.extensions.get('handle_workers')
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=app.config['HANDLE_WORKERS'], thread_name_prefix='handle-checks'
+        )
+        app.extensions['handle_workers'] = executor
+    return executor
+
+
+def profile_url(platform, handle):
+    if platform == 'twitter':
+        return f"https://twitter.com/{handle}"
+    if platform == 'instagram':
+        return f"https://www.instagram.com/{handle}"
+    return handle
+
+
+def probe(platform, handle, timeout=5):
+    """Ask the platform whether a handle exists. Returns VERIFIED, MISSING or UNKNOWN."""
+    try:
+        response = _session.head(profile_url(platform, handle), allow_redirects=True, timeout=timeout)
+    except requests.RequestException:
+        return UNKNOWN
+    if response.status_code == 200:
+        return VERIFIED
+    if response.status_code in (404, 410):
+        return MISSING
+    return UNKNOWN
+
+
+def cached_status(db, platform, handle, ttl, retry_ttl):
+    """Status of a handle from the last check, or None if it was never checked or has expired."""
+    row = db.execute(
+        'SELECT status FROM handle_check WHERE platform = ? AND handle = ?'
+        " AND checked > datetime('now', '-' || CASE status WHEN ? THEN ? ELSE ? END || ' seconds')",
+        (platform, handle, UNKNOWN, int(retry_ttl), int(ttl))
+    ).fetchone()
+    return row[0] if row else None
+
+
+def refresh_statuses(db, user_id, handles):
+    """
+    Set the user's verification status for each {platform: handle}, from the cache
+    where possible and PENDING otherwise. Runs in the caller's transaction; pass the
+    returned pending list to verify_later() once it is committed.
+    Returns (statuses, pending).
+    """
+    config = current_app.config
+    statuses = {}
+    pending = []
+    for platform, handle in handles.items():
+        status = None
+        if handle:
+            status = cached_status(
+                db, platform, handle, config['HANDLE_CACHE_TTL'], config['HANDLE_RETRY_TTL']
+            )
+            if status is None:
+                status = PENDING
+                pending.append((platform, handle))
+        statuses[platform] = status
+
+    db.execute(
+        f"UPDATE user SET {', '.join(f'{PLATFORMS[p][1]} = ?' for p in statuses)} WHERE id = ?",
+        (*statuses.values(), user_id)
+    )
+    return statuses, pending
+
+
+def verify_later(pending):
+    """Check pending (platform, handle) pairs on the worker pool."""
+    app = current_app._get_current_object()
+    for platform, handle in pending:
+        with _in_flight_lock:
+            # A running check updates every user still pending on the same handle
+            if (platform, handle) in _in_flight:
+                continue
+            _in_flight.add((platform, handle))
+        _executor(app).submit(
+            verify_handle, app.config['DATABASE'], platform, handle,
+            app.config['HANDLE_CACHE_TTL'], app.config['HANDLE_RETRY_TTL'],
+            app.config['HANDLE_TIMEOUT'], app.extensions['user_cache']
+        )
+
+
+def verify_handle(database, platform, handle, ttl, retry_ttl, timeout, user_cache):
+    """Check one handle, cache the result and record it on users waiting for it. Runs on the worker pool."""
+    db = sqlite3.connect(database, timeout=30)
+    try:
+        status = cached_status(db, platform, handle, ttl, retry_ttl)
+        if status is None:
+            status = probe(platform, handle, timeout)
+            with db:
+                db.execute(
+                    'INSERT INTO handle_check (platform, handle, status, checked)'
+                    ' VALUES (?, ?, ?, CURRENT_TIMESTAMP)'
+                    ' ON CONFLICT (platform, handle) DO UPDATE'
+                    ' SET status = excluded.status, checked = excluded.checked',
+                    (platform, handle, status)
+                )
+    except Exception as e:
+        print(f"Error verifying {platform} handle {handle}: {e}")
+        status = UNKNOWN
+    finally:
+        # Users marked pending from here on start their own check, which hits the cache
+        with _in_flight_lock:
+            _in_flight.discard((platform, handle))
+
+    handle_column, status_column = PLATFORMS[platform]
+    try:
+        with db:
+            updated = db.execute(
+                f'UPDATE user SET {status_column} = ?'
+                f' WHERE {handle_column} = ? AND {status_column} = ? RETURNING id',
+                (status, handle, PENDING)
+            ).fetchall()
+        user_cache.forget(*(user_id for user_id, in updated))
+    except Exception as e:
+        print(f"Error recording {platform} handle status for {handle}: {e}")
+    finally:
+        db.close()
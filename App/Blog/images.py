@@ -0,0 +1,172 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from PIL import Image, UnidentifiedImageError
+
+# Folders under the static folder that store_upload() writes to; release_images()
+# never deletes anything outside them
+POST_FOLDER = 'uploads'
+PROFILE_FOLDER = os.path.join('static', 'profile_images')
+UPLOAD_FOLDERS = (POST_FOLDER, PROFILE_FOLDER)
+
+# Widths of the resized copies generated for every upload
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANT_FORMAT = 'WEBP'
+VARIANT_EXTENSION = 'webp'
+VARIANT_QUALITY = 80
+
+
+class InvalidImage(ValueError):
+    """Raised when an upload is not a readable image."""
+
+
+def _executor(app):
+    executor = app.extensions.get('image_workers')
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=app.config['IMAGE_WORKERS'], thread_name_prefix='image-variants'
+        )
+        app.extensions['image_workers'] = executor
+    return executor
+
+
+def variant_url(url, width):
+    """URL of the width-pixel variant of the image at url."""
+    stem = url.rsplit('.', 1)[0]
+    return f'{stem}_{width}.{VARIANT_EXTENSION}'
+
+
+def store_upload(db, file, folder):
+    """
+    Save an uploaded image under folder (relative to the static folder), named by
+    its content hash, and queue its resized variants. Uploading the same bytes
+    twice reuses the existing file. Images larger than MAX_IMAGE_PIXELS are
+    rejected before anything is decoded. Returns the image URL relative to static.
+    """
+    data = file.read()
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.verify()
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+    except Image.DecompressionBombError as e:
+        raise InvalidImage(f"{file.filename} has too many pixels") from e
+    except (UnidentifiedImageError, OSError, SyntaxError) as e:
+        raise InvalidImage(f"{file.filename} is not a valid image") from e
+    if width * height > current_app.config['MAX_IMAGE_PIXELS']:
+        raise InvalidImage(f"{file.filename} has too many pixels ({width}x{height})")
+
+    ext = file.filename.rsplit('.', 1)[1].lower()
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    url = f'{folder}/{digest}.{ext}'
+
+    path = os.path.join(current_app.static_folder, url)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    known = db.execute('SELECT variants FROM image WHERE url = ?', (url,)).fetchone()
+    if known is None:
+        db.execute(
+            'INSERT OR IGNORE INTO image (url, width, height) VALUES (?, ?, ?)',
+            (url, width, height)
+        )
+    if known is None or known['variants'] is None:
+        app = current_app._get_current_object()
+        _executor(app).submit(
+            generate_variants, app.static_folder, app.config['DATABASE'], url, width, height
+        )
+
+    return url
+
+
+def generate_variants(static_folder, database, url, width, height):
+    """Write the resized WebP variants of an image and record them. Runs on the worker pool."""
+    variants = []
+    try:
+        with Image.open(os.path.join(static_folder, url)) as img:
+            img.seek(0)
+            source = img.convert('RGBA' if 'A' in img.getbands() or img.mode == 'P' else 'RGB')
+        for target in VARIANT_WIDTHS:
+            if target >= width:
+                break
+            resized = source.copy()
+            resized.thumbnail((target, target * 100), Image.LANCZOS)
+            resized.save(
+                os.path.join(static_folder, variant_url(url, target)),
+                VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4
+            )
+            variants.append([target, variant_url(url, target)])
+    except Exception as e:
+        print(f"Error generating image variants for {url}: {e}")
+        return
+
+    # The uploading request may not have committed its image row yet, so upsert
+    db = sqlite3.connect(database, timeout=30)
+    try:
+        with db:
+            db.execute(
+                'INSERT INTO image (url, width, height, variants) VALUES (?, ?, ?, ?)'
+                ' ON CONFLICT (url) DO UPDATE SET variants = excluded.variants',
+                (url, width, height, json.dumps(variants))
+            )
+    finally:
+        db.close()
+
+
+def image_set(url, width, height, variants):
+    """Describe an image and its variants for API responses, srcset-style."""
+    candidates = json.loads(variants) if variants else []
+    if width:
+        candidates = candidates + [[width, url]]
+    return {
+        "url": url,
+        "width": width,
+        "height": height,
+        "srcset": ", ".join(f"{src} {w}w" for w, src in candidates),
+    }
+
+
+def _is_managed(full_path):
+    """Whether full_path (already resolved) lies inside one of the upload folders."""
+    for folder in UPLOAD_FOLDERS:
+        root = os.path.realpath(os.path.join(current_app.static_folder, folder))
+        if os.path.commonpath([root, full_path]) == root and full_path != root:
+            return True
+    return False
+
+
+def release_images(db, urls):
+    """
+    Delete stored images, with their variants, that no post or profile references
+    any more. Call after the rows pointing at them are removed and committed.
+    """
+    for url in set(urls):
+        in_use = db.execute(
+            'SELECT 1 FROM post_images WHERE image_url = ?'
+            ' UNION ALL SELECT 1 FROM user WHERE profile_image = ? LIMIT 1',
+            (url, url)
+        ).fetchone()
+        if in_use:
+            continue
+
+        paths = [url] + [variant_url(url, width) for width in VARIANT_WIDTHS]
+        full_paths = [os.path.realpath(os.path.join(current_app.static_folder, path)) for path in paths]
+        if not all(_is_managed(full_path) for full_path in full_paths):
+            print(f"Refusing to delete {url}: outside the upload folders")
+            continue
+        for full_path in full_paths:
+            try:
+                if os.path.exists(full_path):
+                    os.remove(full_path)
+            except Exception as e:
+                print(f"Error deleting image file: {e}")
+        db.execute('DELETE FROM image WHERE url = ?', (url,))
+    db.commit()
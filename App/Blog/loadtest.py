@@ -0,0 +1,386 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import click
+from flask import current_app
+from werkzeug.security import generate_password_hash
+from Blog.content import plain_text, summarize
+from Blog.db import discard_db, get_db, init_db, recount_user_stats
+
+# Every generated account logs in with this password
+LOADTEST_PASSWORD = 'Loadtest1'
+
+WORDS = (
+    'tiger elephant heron otter lynx wolf falcon salmon coral reef forest river wetland'
+    ' migration habitat nesting predator prey canopy savanna tundra monsoon drought'
+    ' conservation poaching corridor sighting tracks camera trap census population'
+    ' endangered recovery volunteer ranger sanctuary dawn dusk season rain feeding'
+).split()
+
+# Write statements slower than this to start are counted as having waited for the lock
+LOCK_WAIT_THRESHOLD = 0.005
+
+
+def _sentence(rng, low=6, high=16):
+    words = rng.choices(WORDS, k=rng.randint(low, high))
+    return ' '.join(words).capitalize() + '.'
+
+
+def _body(rng):
+    paragraphs = (
+        ' '.join(_sentence(rng) for _ in range(rng.randint(2, 6)))
+        for _ in range(rng.randint(1, 5))
+    )
+    return ''.join(f'<p>{paragraph}</p>' for paragraph in paragraphs)
+
+
+def _skewed(rng, count):
+    """An id in 1..count, with low ids far more likely, like authors and hot posts."""
+    return min(count, int(rng.paretovariate(1.2)) + rng.randrange(count) // 50 + 1)
+
+
+def _batched(rows, size=10000):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(db, users, posts, comments, images, seed):
+    """
+    Bulk-load synthetic users, posts, images and comments. Triggers are dropped
+    during the load and their derived state (search indexes, counters) rebuilt after.
+    """
+    rng = random.Random(seed)
+    password = generate_password_hash(LOADTEST_PASSWORD)
+    start = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=365)
+    span = 365 * 24 * 60 * 60
+
+    triggers = db.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+    for name, _ in triggers:
+        db.execute(f'DROP TRIGGER {name}')
+
+    db.executemany(
+        'INSERT INTO user (email, username, password, about) VALUES (?, ?, ?, ?)',
+        ((f'user{i}@example.com', f'user{i}', password, _sentence(rng)) for i in range(1, users + 1))
+    )
+
+    post_times = sorted(rng.uniform(0, span) for _ in range(posts))
+    for batch in _batched(range(posts)):
+        rows = []
+        for i in batch:
+            body = _body(rng)
+            excerpt, word_count = summarize(body)
+            created = (start + timedelta(seconds=post_times[i])).strftime('%Y-%m-%d %H:%M:%S')
+            rows.append((_skewed(rng, users), created, _sentence(rng, 3, 8), body, plain_text(body), excerpt, word_count))
+        db.executemany(
+            'INSERT INTO post (author_id, created, title, body, body_text, excerpt, word_count)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+            rows
+        )
+
+    db.executemany(
+        'INSERT INTO post_images (post_id, image_url) VALUES (?, ?)',
+        ((rng.randint(1, posts), f'uploads/loadtest-{i}.jpg') for i in range(images))
+    )
+
+    for batch in _batched(range(comments)):
+        rows = []
+        for _ in batch:
+            post_id = _skewed(rng, posts)
+            created = start + timedelta(seconds=rng.uniform(post_times[post_id - 1], span))
+            created = created.strftime('%Y-%m-%d %H:%M:%S')
+            rows.append((post_id, _skewed(rng, users), _sentence(rng, 3, 20), created))
+        db.executemany(
+            'INSERT INTO comment (post_id, author_id, body, created) VALUES (?, ?, ?, ?)',
+            rows
+        )
+
+    for _, sql in triggers:
+        db.execute(sql)
+    db.execute("INSERT INTO post_fts (post_fts) VALUES ('rebuild')")
+    db.execute("INSERT INTO comment_fts (comment_fts) VALUES ('rebuild')")
+    recount_user_stats(db)
+    db.commit()
+    db.execute('ANALYZE')
+
+
+class LockStats:
+    """Counts how often, and for how long, connections waited to start a write."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.waits = []
+        self.locked_errors = 0
+
+    def record(self, elapsed, locked):
+        with self._lock:
+            self.writes += 1
+            if locked:
+                self.locked_errors += 1
+            elif elapsed >= LOCK_WAIT_THRESHOLD:
+                self.waits.append(elapsed)
+
+    def report(self):
+        with self._lock:
+            return {
+                "write_transactions": self.writes,
+                "lock_waits": len(self.waits),
+                "locked_errors": self.locked_errors,
+                "lock_wait_ms": _percentiles(self.waits),
+            }
+
+
+def timed_connection(stats):
+    """sqlite3.Connection subclass timing the statement that takes each write lock."""
+
+    class TimedConnection(sqlite3.Connection):
+        def execute(self, sql, parameters=()):
+            starts_write = not self.in_transaction and sql.lstrip()[:6].upper() in (
+                'INSERT', 'UPDATE', 'DELETE', 'REPLAC'
+            )
+            if not starts_write:
+                return super().execute(sql, parameters)
+
+            start = time.perf_counter()
+            locked = False
+            try:
+                return super().execute(sql, parameters)
+            except sqlite3.OperationalError as e:
+                locked = 'locked' in str(e)
+                raise
+            finally:
+                stats.record(time.perf_counter() - start, locked)
+
+    return TimedConnection
+
+
+def _percentiles(samples):
+    if not samples:
+        return None
+    samples = sorted(samples)
+
+    def at(p):
+        return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2)
+
+    return {
+        "p50": at(0.5), "p90": at(0.9), "p99": at(0.99), "max": at(1.0),
+        "mean": round(sum(samples) / len(samples) * 1000, 2),
+    }
+
+
+def _worker(app, counts, deadline, requests, write_ratio, seed, results, lock):
+    rng = random.Random(seed)
+    users, posts = counts['users'], counts['posts']
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = rng.randint(1, users)
+
+    cursor = None
+    done = 0
+    while time.monotonic() < deadline and (requests is None or done < requests):
+        if rng.random() < write_ratio:
+            if rng.random() < 0.3:
+                name, call = 'create', lambda: client.post(
+                    '/create', data={'title': _sentence(rng, 3, 8), 'body': _body(rng)}
+                )
+            else:
+                name, call = 'add_comment', lambda: client.post(
+                    f'/post/{_skewed(rng, posts)}/comment', data={'body': _sentence(rng, 3, 20)}
+                )
+        else:
+            pick = rng.random()
+            if pick < 0.4:
+                # Mostly the first page, sometimes the next one
+                page_cursor = cursor if cursor and rng.random() < 0.3 else None
+                name, call = 'index', lambda: client.get(
+                    '/', query_string={'cursor': page_cursor} if page_cursor else None
+                )
+            elif pick < 0.85:
+                name, call = 'view', lambda: client.get(f'/{_skewed(rng, posts)}/view')
+            else:
+                name, call = 'profile', lambda: client.get(f'/auth/profile/{_skewed(rng, users)}')
+
+        start = time.perf_counter()
+        response = call()
+        elapsed = time.perf_counter() - start
+        if name == 'index' and response.status_code == 200:
+            cursor = response.get_json().get('next_cursor')
+        done += 1
+
+        with lock:
+            result = results.setdefault(name, {'latencies': [], 'statuses': {}})
+            result['latencies'].append(elapsed)
+            status = str(response.status_code)
+            result['statuses'][status] = result['statuses'].get(status, 0) + 1
+
+
+def run(app, duration, requests, concurrency, write_ratio, seed):
+    """Drive the Blog endpoints from concurrency threads and return the report."""
+    with app.app_context():
+        db = get_db()
+        tables = {'users': 'user', 'posts': 'post', 'comments': 'comment', 'images': 'post_images'}
+        counts = {
+            name: db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for name, table in tables.items()
+        }
+        discard_db()
+
+    results = {}
+    lock = threading.Lock()
+    per_thread = None if requests is None else -(-requests // concurrency)
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(
+            target=_worker,
+            args=(app, counts, deadline, per_thread, write_ratio, seed + i, results, lock)
+        )
+        for i in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(result['latencies']) for result in results.values())
+    return {
+        "dataset": counts,
+        "elapsed_s": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1) if elapsed else None,
+        "endpoints": {
+            name: {
+                "count": len(result['latencies']),
+                "statuses": result['statuses'],
+                "latency_ms": _percentiles(result['latencies']),
+            }
+            for name, result in sorted(results.items())
+        },
+    }
+
+
+@click.command('generate-data')
+@click.option('--database', type=click.Path(dir_okay=False), help='Database file to create (default: instance/loadtest.sqlite)')
+@click.option('--users', default=10000, help='Number of users')
+@click.option('--posts', default=100000, help='Number of posts')
+@click.option('--comments', default=1000000, help='Number of comments')
+@click.option('--images', default=50000, help='Number of post images')
+@click.option('--seed', default=1, help='Random seed, for repeatable datasets')
+@click.option('--force', is_flag=True, help='Replace an existing database file')
+def generate_data_command(database, users, posts, comments, images, seed, force):
+    """Bulk-load a synthetic Blog database for load testing."""
+    app = current_app._get_current_object()
+    database = database or os.path.join(app.instance_path, 'loadtest.sqlite')
+    if os.path.exists(database):
+        if not force:
+            raise click.ClickException(f'{database} exists; pass --force to replace it.')
+        discard_db()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(database + suffix):
+                os.remove(database + suffix)
+
+    original = app.config['DATABASE']
+    app.config['DATABASE'] = database
+    start = time.perf_counter()
+    try:
+        init_db()
+        generate(get_db(), users, posts, comments, images, seed)
+    finally:
+        discard_db()
+        app.config['DATABASE'] = original
+    click.echo(
+        f'Generated {users} users, {posts} posts, {comments} comments and {images} images'
+        f' in {database} ({time.perf_counter() - start:.1f} s).'
+    )
+
+
+@click.command('load-test')
+@click.option('--database', type=click.Path(exists=True, dir_okay=False), help='Database made by generate-data (default: instance/loadtest.sqlite)')
+@click.option('--duration', default=30.0, help='Seconds to run for')
+@click.option('--requests', type=int, help='Stop after this many requests instead')
+@click.option('--concurrency', default=8, help='Concurrent client threads')
+@click.option('--write-ratio', default=0.1, help='Share of requests that create posts or comments')
+@click.option('--no-response-cache', is_flag=True, help='Disable the rendered response cache')
+@click.option('--seed', default=1, help='Random seed for the request mix')
+@click.option('--output', type=click.Path(dir_okay=False), help='Where to save the JSON results')
+@click.option('--label', default='', help='Name for this run in the results')
+def load_test_command(database, duration, requests, concurrency, write_ratio,
+                      no_response_cache, seed, output, label):
+    """Drive index, view, create, add_comment and profile against a generated database."""
+    app = current_app._get_current_object()
+    database = database or os.path.join(app.instance_path, 'loadtest.sqlite')
+    if not os.path.exists(database):
+        raise click.ClickException(f'{database} does not exist; run generate-data first.')
+
+    lock_stats = LockStats()
+    cache = app.extensions['response_cache']
+    original = {key: app.config.get(key) for key in ('DATABASE', 'SQLITE_CONNECTION_FACTORY')}
+    original_cache_size = cache.max_bytes
+    app.config['DATABASE'] = database
+    app.config['SQLITE_CONNECTION_FACTORY'] = timed_connection(lock_stats)
+    if no_response_cache:
+        cache.max_bytes = 0
+    # Both caches hold rows from whichever database was configured before
+    cache.clear()
+    app.extensions['user_cache'].clear()
+
+    try:
+        report = run(app, duration if requests is None else float('inf'),
+                     requests, concurrency, write_ratio, seed)
+    finally:
+        app.config.update(original)
+        cache.max_bytes = original_cache_size
+        cache.clear()
+        app.extensions['user_cache'].clear()
+
+    report = {
+        "label": label,
+        "started": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "options": {
+            "concurrency": concurrency,
+            "write_ratio": write_ratio,
+            "duration": duration,
+            "requests": requests,
+            "response_cache": not no_response_cache,
+            "seed": seed,
+        },
+        **report,
+        "sqlite": lock_stats.report(),
+    }
+
+    output = output or os.path.join(
+        app.instance_path, f"loadtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    click.echo(f"{report['requests']} requests in {report['elapsed_s']} s ({report['throughput_rps']} req/s)")
+    for name, result in report['endpoints'].items():
+        latency = result['latency_ms']
+        click.echo(
+            f"  {name:12} {result['count']:7}  p50 {latency['p50']:8.2f} ms  p90 {latency['p90']:8.2f} ms"
+            f"  p99 {latency['p99']:8.2f} ms  {result['statuses']}"
+        )
+    sqlite_stats = report['sqlite']
+    click.echo(
+        f"  sqlite: {sqlite_stats['write_transactions']} write transactions,"
+        f" {sqlite_stats['lock_waits']} lock waits, {sqlite_stats['locked_errors']} 'database is locked' errors"
+    )
+    click.echo(f'Results saved to {output}')
+
+
+def init_app(app):
+    app.cli.add_command(generate_data_command)
+    app.cli.add_command(load_test_command)
@@ -0,0 +1,170 @@
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from google.auth import jwt
+from oauthlib.oauth2 import WebApplicationClient
+from urllib3.util.retry import Retry
+
+_MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+def cache_lifetime(headers, default):
+    """Seconds a response may be reused for, from its Cache-Control/Age or Expires headers."""
+    cache_control = headers.get('Cache-Control', '').lower()
+    if 'no-store' in cache_control or 'no-cache' in cache_control:
+        return 0
+
+    match = _MAX_AGE.search(cache_control)
+    if match:
+        age = headers.get('Age', '0')
+        return max(0, int(match.group(1)) - (int(age) if age.isdigit() else 0))
+
+    if headers.get('Expires'):
+        try:
+            expires = parsedate_to_datetime(headers['Expires'])
+            date = parsedate_to_datetime(headers['Date']) if headers.get('Date') else None
+            now = date.timestamp() if date else time.time()
+            return max(0, int(expires.timestamp() - now))
+        except (TypeError, ValueError):
+            return 0
+
+    return default
+
+
+class OAuthProvider:
+    """
+    OpenID Connect client for one provider, shared by every request.
+
+    The discovery document and signing certificates are cached for as long as the
+    provider's cache headers allow, and all calls go through one pooled session, so
+    a login costs the token exchange plus at most one userinfo call.
+    """
+
+    def __init__(self, discovery_url, certs_url, client_id, client_secret,
+                 timeout=10, default_ttl=3600, pool_size=10):
+        self.discovery_url = discovery_url
+        self.certs_url = certs_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.timeout = timeout
+        self.default_ttl = default_ttl
+
+        self.session = requests.Session()
+        # Only idempotent metadata fetches are retried; codes are single-use
+        retries = Retry(total=2, backoff_factor=0.2, allowed_methods={'GET'},
+                        status_forcelist=(502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retries)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._lock = threading.Lock()
+        self._documents = {}    # url -> (expires_at, parsed JSON)
+        self.fetches = 0
+        self.hits = 0
+
+    def _get_json(self, url, refresh=False):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._documents.get(url)
+            if cached is not None and cached[0] > now and not refresh:
+                self.hits += 1
+                return cached[1]
+
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError):
+            if cached is not None:
+                # Serve the last good copy rather than failing every login
+                return cached[1]
+            raise
+
+        with self._lock:
+            self.fetches += 1
+            ttl = cache_lifetime(response.headers, self.default_ttl)
+            if ttl > 0:
+                self._documents[url] = (now + ttl, data)
+        return data
+
+    def config(self):
+        """The provider's OpenID discovery document."""
+        return self._get_json(self.discovery_url)
+
+    def signing_keys(self, refresh=False):
+        """The provider's current ID token signing certificates, by key id."""
+        return self._get_json(self.certs_url, refresh=refresh)
+
+    def authorization_url(self, redirect_uri, scope):
+        return WebApplicationClient(self.client_id).prepare_request_uri(
+            self.config()['authorization_endpoint'],
+            redirect_uri=redirect_uri,
+            scope=scope,
+        )
+
+    def exchange_code(self, authorization_response, redirect_url, code):
+        """Trade an authorization code for tokens. Returns the token response."""
+        # A client per exchange: oauthlib clients keep the token they last parsed
+        client = WebApplicationClient(self.client_id)
+        token_url, headers, body = client.prepare_token_request(
+            self.config()['token_endpoint'],
+            authorization_response=authorization_response,
+            redirect_url=redirect_url,
+            code=code
+        )
+        response = self.session.post(
+            token_url,
+            headers=headers,
+            data=body,
+            auth=(self.client_id, self.client_secret),
+            timeout=self.timeout,
+        )
+        return dict(client.parse_request_body_response(response.text))
+
+    def verify_id_token(self, token):
+        """Verify an ID token's signature, audience and issuer against the cached keys."""
+        try:
+            claims = jwt.decode(token, certs=self.signing_keys(), audience=self.client_id)
+        except ValueError as e:
+            if 'key id' not in str(e).lower():
+                raise
+            # Signed with a key issued since the certificates were cached
+            claims = jwt.decode(token, certs=self.signing_keys(refresh=True), audience=self.client_id)
+
+        issuer = self.config()['issuer']
+        if claims.get('iss') not in (issuer, issuer.replace('https://', '')):
+            raise ValueError(f"Unexpected ID token issuer {claims.get('iss')}")
+        return claims
+
+    def userinfo(self, access_token):
+        response = self.session.get(
+            self.config()['userinfo_endpoint'],
+            headers={'Authorization': f'Bearer {access_token}'},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def login_claims(self, authorization_response, redirect_url, code):
+        """
+        Complete a login and return the user's claims. The ID token in the token
+        response usually carries everything; userinfo is only called when it doesn't.
+        """
+        token = self.exchange_code(authorization_response, redirect_url, code)
+        claims = {}
+        if token.get('id_token'):
+            claims = self.verify_id_token(token['id_token'])
+        if 'email' not in claims:
+            claims = {**claims, **self.userinfo(token['access_token'])}
+        return claims
+
+    def stats(self):
+        with self._lock:
+            return {
+                "fetches": self.fetches,
+                "hits": self.hits,
+                "cached": len(self._documents),
+            }
@@ -0,0 +1,240 @@
+import atexit
+import math
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class Saturated(Exception):
+    """Raised when the hashing pool and its queue are full, or the pool could not answer in time."""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many password checks in progress')
+        self.retry_after = retry_after
+
+
+class Throttled(Exception):
+    """Raised when a client or account has used up its attempts for now."""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many attempts')
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a bounded process pool, so KDF work
+    never holds a request thread's GIL. At most workers + max_queue operations are
+    admitted at once; the rest are rejected immediately with Saturated. A slot is
+    only freed once its job has actually finished, even if the caller gave up on it.
+
+    The pool starts on first use, so CLI commands never launch it, and is rebuilt
+    if a worker dies.
+    """
+
+    def __init__(self, workers, max_queue, timeout):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._latencies = deque(maxlen=1000)
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.restarts = 0
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # The pool starts lazily, after request and worker threads exist, so
+                # never fork; forkserver children come from a clean single-threaded parent
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(method)
+                )
+            return self._executor
+
+    def _discard(self, executor):
+        """Drop a broken pool so the next operation starts a fresh one."""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _finished(self, start):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self._latencies.append(time.perf_counter() - start)
+        self._slots.release()
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Saturated(self.retry_after())
+
+        start = time.perf_counter()
+        with self._lock:
+            self.in_flight += 1
+        executor = None
+        try:
+            executor = self._pool()
+            future = executor.submit(fn, *args)
+        except BaseException as e:
+            self._finished(start)
+            if isinstance(e, BrokenProcessPool):
+                self._discard(executor)
+                raise Saturated(self.retry_after()) from e
+            raise
+        # The slot stays taken until the job is done, even if we stop waiting for it
+        future.add_done_callback(lambda _: self._finished(start))
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError as e:
+            with self._lock:
+                self.timed_out += 1
+            raise Saturated(self.retry_after()) from e
+        except BrokenProcessPool as e:
+            self._discard(executor)
+            raise Saturated(self.retry_after()) from e
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def retry_after(self):
+        """Seconds until a full queue has likely drained."""
+        with self._lock:
+            mean = sum(self._latencies) / len(self._latencies) if self._latencies else 1.0
+        return max(1, math.ceil(mean * (self.workers + self.max_queue) / self.workers))
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            in_flight = self.in_flight
+            completed, rejected = self.completed, self.rejected
+            timed_out, restarts = self.timed_out, self.restarts
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": in_flight,
+            "queue_depth": max(0, in_flight - self.workers),
+            "completed": completed,
+            "rejected": rejected,
+            "timed_out": timed_out,
+            "restarts": restarts,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)},
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+class SlidingWindow:
+    """Counts events per key over the last window seconds, tracking at most max_keys keys."""
+
+    def __init__(self, limit, window, max_keys=10000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._events = OrderedDict()   # key -> deque of event times
+        self.blocked = 0
+
+    def _recent(self, key, now):
+        # Caller must hold self._lock
+        events = self._events.get(key)
+        if events is None:
+            return None
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        if not events:
+            del self._events[key]
+            return None
+        return events
+
+    def check(self, key):
+        """Raise Throttled if key is already at its limit."""
+        now = time.monotonic()
+        with self._lock:
+            events = self._recent(key, now)
+            if events is not None and len(events) >= self.limit:
+                self.blocked += 1
+                raise Throttled(max(1, math.ceil(events[0] + self.window - now)))
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            events = self._recent(key, now)
+            if events is None:
+                events = self._events[key] = deque()
+            events.append(now)
+            self._events.move_to_end(key)
+            while len(self._events) > self.max_keys:
+                self._events.popitem(last=False)
+
+    def reset(self, key):
+        with self._lock:
+            self._events.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"tracked": len(self._events), "blocked": self.blocked}
+
+
+def get_hasher():
+    return current_app.extensions['password_hasher']
+
+
+def client_throttle():
+    """Attempts per client address on login and register."""
+    return current_app.extensions['password_throttles'][0]
+
+
+def account_throttle():
+    """Failed logins per username."""
+    return current_app.extensions['password_throttles'][1]
+
+
+def stats():
+    client, account = current_app.extensions['password_throttles']
+    return {
+        **get_hasher().stats(),
+        "client_throttle": client.stats(),
+        "account_throttle": account.stats(),
+    }
+
+
+def init_app(app):
+    hasher = PasswordHasher(
+        app.config['PASSWORD_WORKERS'], app.config['PASSWORD_QUEUE'], app.config['PASSWORD_TIMEOUT']
+    )
+    atexit.register(hasher.shutdown)
+    app.extensions['password_hasher'] = hasher
+    app.extensions['password_throttles'] = (
+        SlidingWindow(app.config['AUTH_CLIENT_ATTEMPTS'], app.config['AUTH_CLIENT_WINDOW']),
+        SlidingWindow(app.config['AUTH_ACCOUNT_FAILURES'], app.config['AUTH_ACCOUNT_WINDOW']),
+    )
@@ -1,6 +1,14 @@
-DROP TABLE IF EXISTS user;
-DROP TABLE IF EXISTS post;
+-- Tables added by migrations in db.py
+DROP TABLE IF EXISTS handle_check;
+DROP TABLE IF EXISTS image;
+DROP TABLE IF EXISTS data_version;
+DROP TABLE IF EXISTS comment_fts;
+DROP TABLE IF EXISTS post_fts;
+
+DROP TABLE IF EXISTS comment;
 DROP TABLE IF EXISTS post_images;
+DROP TABLE IF EXISTS post;
+DROP TABLE IF EXISTS user;
 
 CREATE TABLE user (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
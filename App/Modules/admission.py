@@ -0,0 +1,196 @@
+from collections import OrderedDict, deque
+import functools
+import math
+import threading
+import time
+
+from flask import jsonify, make_response, request
+
+# Clients tracked per endpoint for rate limiting; the least recently seen are forgotten
+MAX_CLIENTS = 10000
+# Recent queue waits and service times kept for metrics and Retry-After estimates
+SAMPLE_SIZE = 1000
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted; carries the HTTP status and Retry-After seconds."""
+
+    def __init__(self, status, retry_after, message):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    """Per-client token buckets refilling at rate tokens per second, up to burst."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = OrderedDict()   # client -> (tokens, last refill time)
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """Spend a token for client. Returns 0 if one was available, else seconds until one is."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def refund(self, client):
+        """Give back a token spent by a request that was then turned away."""
+        with self._lock:
+            entry = self._buckets.get(client)
+            if entry is not None:
+                self._buckets[client] = (min(self.burst, entry[0] + 1), entry[1])
+
+
+class Gate:
+    """
+    Admission control for one endpoint.
+
+    Each client first spends a token from its bucket (429 when empty). At most
+    max_concurrent requests then run at once; up to max_queue more wait in FIFO
+    order for at most queue_timeout seconds, and anything beyond that is turned
+    away at once with a 503. Requests turned away with a 503 get their token back.
+    """
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout, rate, burst):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.buckets = TokenBuckets(rate, burst)
+
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._active = 0
+        self._waits = deque(maxlen=SAMPLE_SIZE)
+        self._service = deque(maxlen=SAMPLE_SIZE)
+        self.admitted = 0
+        self.rate_limited = 0
+        self.queue_full = 0
+        self.timed_out = 0
+
+    def _retry_after(self):
+        # Caller must hold self._lock
+        service = sum(self._service) / len(self._service) if self._service else 1.0
+        return max(1, math.ceil(service * (len(self._waiters) + 1) / self.max_concurrent))
+
+    def acquire(self, client):
+        wait = self.buckets.take(client)
+        if wait:
+            with self._lock:
+                self.rate_limited += 1
+            raise Rejected(429, max(1, math.ceil(wait)), "Too many requests, slow down")
+
+        start = time.monotonic()
+        with self._lock:
+            if self._active < self.max_concurrent:
+                self._active += 1
+                self.admitted += 1
+                self._waits.append(0.0)
+                return
+            if len(self._waiters) >= self.max_queue:
+                self.queue_full += 1
+                self.buckets.refund(client)
+                raise Rejected(503, self._retry_after(), "Server is busy, try again shortly")
+            ticket = threading.Event()
+            self._waiters.append(ticket)
+
+        ticket.wait(self.queue_timeout)
+        with self._lock:
+            # release() hands the slot over by setting the ticket, possibly just as we timed out
+            if not ticket.is_set():
+                self._waiters.remove(ticket)
+                self.timed_out += 1
+                self.buckets.refund(client)
+                raise Rejected(503, self._retry_after(), "Server is busy, try again shortly")
+            self.admitted += 1
+            self._waits.append(time.monotonic() - start)
+
+    def release(self, service_time):
+        with self._lock:
+            self._service.append(service_time)
+            if self._waiters:
+                # The slot passes straight to the longest waiter, so _active is unchanged
+                self._waiters.popleft().set()
+            else:
+                self._active -= 1
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            stats = {
+                "active": self._active,
+                "waiting": len(self._waiters),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": {
+                    "rate_limited": self.rate_limited,
+                    "queue_full": self.queue_full,
+                    "timed_out": self.timed_out,
+                },
+            }
+
+        def percentile(p):
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 2)
+
+        stats["queue_wait_ms"] = {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)}
+        return stats
+
+
+_gates = {}
+
+
+def admit(max_concurrent, max_queue, queue_timeout=10, rate=1.0, burst=5):
+    """
+    Decorator putting a Flask view behind a Gate. Rejected requests get a JSON error
+    with a Retry-After header instead of tying up a worker thread.
+    """
+    def decorator(view):
+        gate = _gates[view.__name__] = Gate(
+            view.__name__, max_concurrent, max_queue, queue_timeout, rate, burst
+        )
+
+        @functools.wraps(view)
+        def wrapped_view(*args, **kwargs):
+            try:
+                gate.acquire(request.remote_addr)
+            except Rejected as e:
+                response = jsonify({"success": False, "error": str(e)})
+                response.status_code = e.status
+                response.headers["Retry-After"] = str(e.retry_after)
+                return response
+
+            start = time.monotonic()
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                gate.release(time.monotonic() - start)
+                raise
+            if response.is_streamed:
+                # Streamed bodies keep their slot until the client has been sent everything
+                response.call_on_close(lambda: gate.release(time.monotonic() - start))
+            else:
+                gate.release(time.monotonic() - start)
+            return response
+        return wrapped_view
+    return decorator
+
+
+def stats():
+    """Admission metrics for every gated endpoint."""
+    return {name: gate.stats() for name, gate in _gates.items()}
@@ -0,0 +1,313 @@
+from contextlib import contextmanager
+import os
+import shutil
+import threading
+import time
+import uuid
+import weakref
+
+TEMP_ROOT = "./Temp"
+JOBS_DIR = "Jobs"
+OWNER_FILE = ".owner"
+
+# Eviction limits for everything under TEMP_ROOT
+MAX_TOTAL_BYTES = 2 * 1024 * 1024 * 1024
+MAX_AGE_SECONDS = 24 * 60 * 60
+# Entries younger than this are never evicted for size, so in-flight writes survive
+GRACE_SECONDS = 5 * 60
+# Automatic sweeps triggered by new jobs run at most this often
+SWEEP_INTERVAL_SECONDS = 60
+
+# Folders holding inputs or caches with their own bookkeeping rather than generated
+# artifacts; only leftover TEMP_SUFFIX files from interrupted writes are evicted there
+PROTECTED = {"Background", "Animal"}
+TEMP_SUFFIX = ".tmp"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _tree_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                continue
+    return total
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+class ArtifactStore:
+    """
+    Bookkeeping for the temporary audio and video files written under ./Temp.
+
+    Each job gets its own working directory under Temp/Jobs, tagged with the owning
+    process id so directories left behind by a crash can be reclaimed. Other files
+    are evicted oldest first once they pass the age limit or the folder grows past
+    its byte budget, except for paths currently held with acquire().
+    """
+
+    def __init__(self, root=TEMP_ROOT, max_total_bytes=MAX_TOTAL_BYTES,
+                 max_age_seconds=MAX_AGE_SECONDS, grace_seconds=GRACE_SECONDS,
+                 protected=PROTECTED):
+        self.root = root
+        self.max_total_bytes = max_total_bytes
+        self.max_age_seconds = max_age_seconds
+        self.grace_seconds = grace_seconds
+        self.protected = set(protected)
+
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()     # one sweep at a time
+        self._refs = {}          # abspath -> reference count
+        self._last_sweep = 0.0
+        self._evicted_files = 0
+        self._evicted_bytes = 0
+        self._reclaimed_jobs = 0
+
+    @property
+    def jobs_root(self):
+        return os.path.join(self.root, JOBS_DIR)
+
+    def acquire(self, path):
+        """Protect path from eviction until a matching release()"""
+        key = os.path.abspath(path)
+        with self._lock:
+            self._refs[key] = self._refs.get(key, 0) + 1
+        return path
+
+    def release(self, path):
+        """Drop one reference taken with acquire()"""
+        key = os.path.abspath(path)
+        with self._lock:
+            count = self._refs.get(key, 0) - 1
+            if count > 0:
+                self._refs[key] = count
+            else:
+                self._refs.pop(key, None)
+
+    def _is_referenced(self, path):
+        # Caller must hold self._lock
+        key = os.path.abspath(path)
+        if key in self._refs:
+            return True
+        prefix = key + os.sep
+        return any(ref.startswith(prefix) for ref in self._refs)
+
+    @contextmanager
+    def job(self, keep=False):
+        """
+        Allocate a working directory for one job and remove it when the job ends.
+        Pass keep=True to leave it in place for the sweeper to age out.
+        """
+        self.maybe_sweep()
+
+        path = os.path.join(self.jobs_root, uuid.uuid4().hex)
+        os.makedirs(path)
+        with open(os.path.join(path, OWNER_FILE), 'w') as f:
+            f.write(str(os.getpid()))
+
+        self.acquire(path)
+        try:
+            yield path
+        finally:
+            self.release(path)
+            if not keep:
+                _remove(path)
+
+    def _orphaned_jobs(self):
+        """Job directories whose owning process is gone"""
+        orphans = []
+        if not os.path.isdir(self.jobs_root):
+            return orphans
+        for name in os.listdir(self.jobs_root):
+            path = os.path.join(self.jobs_root, name)
+            try:
+                with open(os.path.join(path, OWNER_FILE)) as f:
+                    pid = int(f.read().strip())
+            except (OSError, ValueError):
+                pid = None
+            if pid is None or not _pid_alive(pid):
+                orphans.append(path)
+        return orphans
+
+    def _entries(self):
+        """Evictable units: job directories and individual files elsewhere under root"""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            rel = os.path.relpath(dirpath, self.root)
+            if rel == JOBS_DIR:
+                for name in dirnames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        mtime = os.path.getmtime(path)
+                    except OSError:
+                        continue
+                    entries.append((path, mtime, _tree_size(path)))
+                dirnames[:] = []
+                continue
+            protected = rel.split(os.sep)[0] in self.protected
+            for name in filenames:
+                if protected and not name.endswith(TEMP_SUFFIX):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st.st_mtime, st.st_size))
+        return entries
+
+    def _remove_unreferenced(self, path):
+        """Remove path unless it was acquired since the sweep chose it"""
+        with self._lock:
+            if self._is_referenced(path):
+                return False
+        _remove(path)
+        return True
+
+    def sweep(self):
+        """
+        Reclaim crashed jobs, then evict by age and by total size.
+
+        The tree is walked and files are deleted without holding the lock, so
+        acquire() and release() never wait on disk I/O; the lock is only taken to
+        pick what to remove and to re-check each path just before it goes.
+        """
+        with self._sweep_lock:
+            now = time.time()
+            orphans = [(path, _tree_size(path)) for path in self._orphaned_jobs()]
+            entries = sorted(self._entries(), key=lambda e: e[1])
+
+            with self._lock:
+                self._last_sweep = now
+                reclaim = [(path, size) for path, size in orphans if not self._is_referenced(path)]
+                reclaimed = {path for path, _ in reclaim}
+                total = sum(size for path, _, size in entries if path not in reclaimed)
+
+                evict = []
+                for path, mtime, size in entries:
+                    if os.path.dirname(path) == self.jobs_root:
+                        # Live jobs of other processes are only reclaimed once they exit
+                        continue
+                    age = now - mtime
+                    expired = age > self.max_age_seconds
+                    over_budget = total > self.max_total_bytes and age > self.grace_seconds
+                    if not (expired or over_budget) or self._is_referenced(path):
+                        continue
+                    evict.append((path, size))
+                    total -= size
+
+            for path, size in reclaim:
+                if self._remove_unreferenced(path):
+                    with self._lock:
+                        self._reclaimed_jobs += 1
+                        self._evicted_bytes += size
+            for path, size in evict:
+                if self._remove_unreferenced(path):
+                    with self._lock:
+                        self._evicted_files += 1
+                        self._evicted_bytes += size
+
+    def maybe_sweep(self):
+        """Start a background sweep if the last one is older than SWEEP_INTERVAL_SECONDS"""
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < SWEEP_INTERVAL_SECONDS:
+                return
+            self._last_sweep = now
+        threading.Thread(target=self.sweep, name="artifact-sweep", daemon=True).start()
+
+    def usage(self):
+        """Disk usage and eviction counters for the temp folder"""
+        areas = {}
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                area = name if os.path.isdir(path) else "."
+                stats = areas.setdefault(area, {"bytes": 0, "files": 0})
+                if os.path.isdir(path):
+                    for _, _, filenames in os.walk(path):
+                        stats["files"] += len(filenames)
+                    stats["bytes"] += _tree_size(path)
+                else:
+                    stats["files"] += 1
+                    stats["bytes"] += os.path.getsize(path)
+
+        with self._lock:
+            return {
+                "root": os.path.abspath(self.root),
+                "total_bytes": sum(a["bytes"] for a in areas.values()),
+                "max_total_bytes": self.max_total_bytes,
+                "areas": areas,
+                "active_refs": len(self._refs),
+                "evicted_files": self._evicted_files,
+                "evicted_bytes": self._evicted_bytes,
+                "reclaimed_jobs": self._reclaimed_jobs,
+                "last_sweep": self._last_sweep or None,
+            }
+
+
+def _release_all(store, paths):
+    for path in paths.values():
+        store.release(path)
+    paths.clear()
+
+
+class Holds:
+    """
+    Paths held in an ArtifactStore on behalf of one owner, such as a UI session,
+    at most one per key. Everything still held is released by release_all() or
+    when the Holds object is garbage collected, so an owner that goes away
+    without cleaning up does not pin its files forever.
+    """
+
+    def __init__(self, store):
+        self._store = store
+        self._paths = {}        # key -> path
+        weakref.finalize(self, _release_all, store, self._paths)
+
+    def hold(self, key, path):
+        """Hold path under key, releasing whatever key held before"""
+        previous = self._paths.pop(key, None)
+        if previous:
+            self._store.release(previous)
+        if path:
+            self._paths[key] = self._store.acquire(path)
+        return path
+
+    def release_all(self):
+        _release_all(self._store, self._paths)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide artifact store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+        return _store
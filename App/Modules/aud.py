@@ -1,45 +1,30 @@
 from pydub import AudioSegment
 import os
-import random
 from pathlib import Path
 import asyncio
-import aiohttp
-import tempfile
 import uuid
 import shutil
 
+from Modules.background import get_library
+from Modules.sounds import get_clip_cache
+from Modules.artifacts import get_store
+
 async def get_random_background_music(music_folder):
     """Get a random background music file from the specified folder"""
-    audio_extensions = {'.mp3'}
-    
-    music_files = [
-        str(f) for f in Path(music_folder).iterdir()
-        if f.is_file() and f.suffix.lower() in audio_extensions
-    ]
-    
-    if not music_files:
-        raise ValueError(f"No audio files found in {music_folder}")
-    
-    return random.choice(music_files)
+    return get_library(music_folder).choose()
 
 async def download_audio(url, save_path=None):
     """
     Download audio file from a URL and return the path
-    If save_path is None, use a temporary file
+    Clips are fetched through the shared clip cache; if save_path is given the
+    cached clip is copied there
     """
-    if save_path is None:
-        fd, save_path = tempfile.mkstemp(suffix=".mp3")
-        os.close(fd)
+    cached_path = await get_clip_cache().fetch(url)
+    if cached_path is None or save_path is None:
+        return cached_path
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to download audio: {response.status}")
-                
-                with open(save_path, 'wb') as f:
-                    f.write(await response.read())
-        
+        shutil.copy(cached_path, save_path)
         return save_path
     except Exception as e:
         print(f"Error downloading audio: {e}")
@@ -101,7 +86,8 @@ async def mix_audio(main_audio_path, animal_audio_path=None, background_music_pa
         # If we have background music, process it
         if background_music_path:
             try:
-                background = AudioSegment.from_file(background_music_path)
+                # Decoded and loudness-normalized once, then served from the library cache
+                background = get_library().load(background_music_path)
                 
                 # Loop background if it's shorter than main audio
                 if len(background) < main_duration:
@@ -134,72 +120,88 @@ async def mix_audio(main_audio_path, animal_audio_path=None, background_music_pa
         return False, f"Error mixing audio: {str(e)}"
     
 
-async def process_audio(narrative, audio_urls=None):
-    """Process audio with detailed debugging for background music issues"""
+async def process_audio(narrative, audio_urls=None, on_audio=None, output_filename=None):
+    """
+    Process audio with detailed debugging for background music issues
+    narrative may be the full text or an iterable of streamed text chunks; on_audio,
+    if given, receives the narration's MP3 bytes as they are synthesized, before mixing
+    """
     try:
         # Create necessary directories
-        os.makedirs("./Temp/Normal", exist_ok=True)
         os.makedirs("./Temp/Mixed", exist_ok=True)
         os.makedirs("./Temp/Background", exist_ok=True)
         os.makedirs("./Temp/Animal", exist_ok=True)
         
-        # Generate the main narrative audio
-        from Modules.tts import speak
-        await speak(narrative)
-        main_audio_path = "./Temp/Normal/main.mp3"
-        
-        # Generate a unique filename for the output
+        # Intermediate files live in a per-job directory that is removed afterwards
+        with get_store().job() as work_dir:
+            return await _process_audio(narrative, audio_urls, work_dir, on_audio, output_filename)
+            
+    except Exception as e:
+        print(f"[ERROR] Error in process_audio: {str(e)}")
+        return None
+
+async def _process_audio(narrative, audio_urls, work_dir, on_audio=None, output_filename=None):
+    # Generate the main narrative audio
+    from Modules.tts import speak, speak_stream
+    main_audio_path = os.path.join(work_dir, "main.mp3")
+    if isinstance(narrative, str):
+        await speak(narrative, main_audio_path)
+        if on_audio is not None:
+            with open(main_audio_path, 'rb') as f:
+                on_audio(f.read())
+    else:
+        # Streamed narration (e.g. Modules.llm.narrate_stream) is synthesized sentence by sentence
+        await speak_stream(narrative, main_audio_path, on_audio=on_audio)
+    
+    # Generate a unique filename for the output
+    if output_filename is None:
         output_filename = f"mixed_{uuid.uuid4().hex}.mp3"
-        output_path = f"./Temp/Mixed/{output_filename}"
-        
-        # Download animal sound if available
-        animal_audio_path = None
-        if audio_urls and len(audio_urls) > 0:
-            for audio_data in audio_urls:
-                if 'url' in audio_data and audio_data['url']:
-                    animal_audio_path = await download_audio(audio_data['url'], f"./Temp/Animal/animal_{uuid.uuid4().hex}.mp3")
-                    if animal_audio_path:
-                        break
-        
-        # Check background music directory content
-        bg_dir = "./Temp/Background"
-        print(f"[DEBUG] Checking background music directory: {bg_dir}")
-         
-        # Get background music with direct file selection if needed
-        background_music_path = None
-        try:
-            background_music_path = await get_random_background_music("./Temp/Background")
-            if background_music_path:
-                # Verify file exists
-                if not os.path.isfile(background_music_path):
-                    print(f"[ERROR] Background music file does not exist: {background_music_path}")
-                    background_music_path = None
-            else:
-                
-                # Try direct file selection as fallback if directory exists
-                bg_dir_path = Path("./Temp/Background")
-                if bg_dir_path.exists():
-                    mp3_files = list(bg_dir_path.glob("*.mp3"))
-                    if mp3_files:
-                        background_music_path = str(mp3_files[0])
-        except Exception as e:
-            print(f"[ERROR] Error getting background music: {str(e)}")
-        
-        # Mix all available audio sources
-        success, result = await mix_audio(
-            main_audio_path=main_audio_path,
-            animal_audio_path=animal_audio_path,
-            background_music_path=background_music_path,
-            output_path=output_path
-        )
-        
-        if success:
-            return output_filename
+    output_path = f"./Temp/Mixed/{output_filename}"
+    
+    # Download animal sound if available
+    animal_audio_path = None
+    if audio_urls and len(audio_urls) > 0:
+        for audio_data in audio_urls:
+            if 'url' in audio_data and audio_data['url']:
+                animal_audio_path = await download_audio(audio_data['url'])
+                if animal_audio_path:
+                    break
+    
+    # Check background music directory content
+    bg_dir = "./Temp/Background"
+    print(f"[DEBUG] Checking background music directory: {bg_dir}")
+     
+    # Get background music with direct file selection if needed
+    background_music_path = None
+    try:
+        background_music_path = await get_random_background_music("./Temp/Background")
+        if background_music_path:
+            # Verify file exists
+            if not os.path.isfile(background_music_path):
+                print(f"[ERROR] Background music file does not exist: {background_music_path}")
+                background_music_path = None
         else:
-            print(f"[ERROR] Audio mixing failed: {result}, copying main audio instead")
-            shutil.copy(main_audio_path, output_path)
-            return output_filename
             
+            # Try direct file selection as fallback if directory exists
+            bg_dir_path = Path("./Temp/Background")
+            if bg_dir_path.exists():
+                mp3_files = list(bg_dir_path.glob("*.mp3"))
+                if mp3_files:
+                    background_music_path = str(mp3_files[0])
     except Exception as e:
-        print(f"[ERROR] Error in process_audio: {str(e)}")
-        return None
\ No newline at end of file
+        print(f"[ERROR] Error getting background music: {str(e)}")
+    
+    # Mix all available audio sources
+    success, result = await mix_audio(
+        main_audio_path=main_audio_path,
+        animal_audio_path=animal_audio_path,
+        background_music_path=background_music_path,
+        output_path=output_path
+    )
+    
+    if success:
+        return output_filename
+    else:
+        print(f"[ERROR] Audio mixing failed: {result}, copying main audio instead")
+        shutil.copy(main_audio_path, output_path)
+        return output_filename
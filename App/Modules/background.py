@@ -0,0 +1,157 @@
+from pydub import AudioSegment
+from collections import OrderedDict
+from pathlib import Path
+import os
+import random
+import threading
+
+BACKGROUND_FOLDER = "./Temp/Background"
+AUDIO_EXTENSIONS = {'.mp3'}
+
+# Loudness every background track is normalized to before mixing
+TARGET_DBFS = -20.0
+# Upper bound on decoded PCM kept in memory (bytes)
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+
+class BackgroundLibrary:
+    """
+    Index of background music tracks with a memory-bounded cache of decoded,
+    loudness-normalized audio.
+
+    The folder is listed once and only rescanned when its mtime changes, and each
+    track is decoded at most once while it stays in the cache.
+    """
+
+    def __init__(self, folder=BACKGROUND_FOLDER, target_dbfs=TARGET_DBFS,
+                 max_cache_bytes=MAX_CACHE_BYTES, preload=True):
+        self.folder = folder
+        self.target_dbfs = target_dbfs
+        self.max_cache_bytes = max_cache_bytes
+        self.preload = preload
+
+        self._lock = threading.Lock()
+        self._folder_mtime = None
+        self._tracks = {}               # path -> (mtime_ns, size)
+        self._cache = OrderedDict()     # path -> ((mtime_ns, size), AudioSegment)
+        self._cache_bytes = 0
+
+    @staticmethod
+    def _signature(path):
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self, force=False):
+        """Rescan the folder if it changed since the last scan"""
+        try:
+            folder_mtime = os.stat(self.folder).st_mtime_ns
+        except FileNotFoundError:
+            with self._lock:
+                self._folder_mtime = None
+                self._tracks = {}
+            return []
+
+        with self._lock:
+            if not force and folder_mtime == self._folder_mtime:
+                return list(self._tracks)
+
+            tracks = {}
+            for f in Path(self.folder).iterdir():
+                if f.is_file() and f.suffix.lower() in AUDIO_EXTENSIONS:
+                    try:
+                        tracks[str(f)] = self._signature(f)
+                    except FileNotFoundError:
+                        continue
+
+            # Forget decoded audio for tracks that were removed
+            for path in list(self._cache):
+                if path not in tracks:
+                    self._evict(path)
+
+            self._tracks = tracks
+            self._folder_mtime = folder_mtime
+            paths = list(tracks)
+
+        if self.preload and paths:
+            threading.Thread(target=self.warm, daemon=True).start()
+
+        return paths
+
+    def tracks(self):
+        """Return the paths of all indexed tracks"""
+        return self.refresh()
+
+    def choose(self):
+        """Pick a random track path"""
+        tracks = self.refresh()
+        if not tracks:
+            raise ValueError(f"No audio files found in {self.folder}")
+        return random.choice(tracks)
+
+    def load(self, path):
+        """Return the decoded, normalized track, decoding it only on a cache miss"""
+        path = str(path)
+        signature = self._signature(path)
+
+        with self._lock:
+            entry = self._cache.get(path)
+            if entry is not None and entry[0] == signature:
+                self._cache.move_to_end(path)
+                return entry[1]
+
+        audio = AudioSegment.from_file(path)
+        if audio.dBFS != float('-inf'):
+            audio = audio.apply_gain(self.target_dbfs - audio.dBFS)
+
+        with self._lock:
+            self._evict(path)
+            size = len(audio.raw_data)
+            if size <= self.max_cache_bytes:
+                self._cache[path] = (signature, audio)
+                self._cache_bytes += size
+                while self._cache_bytes > self.max_cache_bytes:
+                    self._evict(next(iter(self._cache)))
+
+        return audio
+
+    def warm(self):
+        """Decode indexed tracks ahead of time until the cache budget is used up"""
+        with self._lock:
+            pending = [p for p in self._tracks if p not in self._cache]
+        for path in pending:
+            with self._lock:
+                if self._cache_bytes >= self.max_cache_bytes:
+                    break
+            try:
+                self.load(path)
+            except Exception as e:
+                print(f"[ERROR] Failed to preload background track {path}: {e}")
+
+    def stats(self):
+        """Return cache occupancy figures"""
+        with self._lock:
+            return {
+                "tracks": len(self._tracks),
+                "cached_tracks": len(self._cache),
+                "cached_bytes": self._cache_bytes,
+                "max_cache_bytes": self.max_cache_bytes,
+            }
+
+    def _evict(self, path):
+        # Caller must hold self._lock
+        entry = self._cache.pop(path, None)
+        if entry is not None:
+            self._cache_bytes -= len(entry[1].raw_data)
+
+
+_libraries = {}
+_libraries_lock = threading.Lock()
+
+
+def get_library(folder=BACKGROUND_FOLDER):
+    """Return the shared library for a folder, creating it on first use"""
+    key = os.path.abspath(folder)
+    with _libraries_lock:
+        if key not in _libraries:
+            _libraries[key] = BackgroundLibrary(folder)
+        return _libraries[key]
@@ -1,28 +1,234 @@
 import google.generativeai as genai
 from dotenv import load_dotenv
+import argparse
+import json
 import os
+import sqlite3
+import threading
 from time import time
 
 
-load_dotenv()
-api_key = os.environ.get('API')
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel("gemini-1.5-flash")
+MODEL_NAME = "gemini-1.5-flash"
 
+# Bump whenever the prompts change so stale narrations are regenerated
+PROMPT_VERSION = 1
+PROMPT = "Acting as David Attenborough, narrate the life of {name} without any markdown formatting. Do not mention where the specie stays or is found."
+BATCH_PROMPT = """Acting as David Attenborough, narrate the life of each of the following species without any markdown formatting. Do not mention where the species stays or is found.
+Respond with a JSON object of the form {{"narrations": [{{"species": "<name exactly as given>", "narration": "<text>"}}]}} containing one entry per species.
+Species:
+{names}"""
 
-def narrate(name: str) -> str:
+NARRATION_DB = os.environ.get(
+    'NARRATION_DB',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'narrations.sqlite')
+)
+BATCH_SIZE = 8
 
-    response = model.generate_content(f"Acting as David Attenborough, narrate the life of {name} without any markdown formatting. Do not mention where the specie stays or is found.")
+_model = None
+_model_lock = threading.Lock()
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
 
+
+def get_model():
+    """Configure Gemini on first use rather than when the module is imported."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            load_dotenv()
+            genai.configure(api_key=os.environ.get('API'))
+            _model = genai.GenerativeModel(MODEL_NAME)
+        return _model
+
+
+def _species_key(name: str) -> str:
+    return " ".join(name.split()).lower()
+
+
+def _create_schema(db):
+    db.executescript(
+        'CREATE TABLE IF NOT EXISTS narration ('
+        '  species TEXT NOT NULL,'
+        '  prompt_version INTEGER NOT NULL,'
+        '  name TEXT NOT NULL,'
+        '  body TEXT NOT NULL,'
+        '  created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,'
+        '  PRIMARY KEY (species, prompt_version)'
+        ');'
+        'CREATE TABLE IF NOT EXISTS recent_species ('
+        '  species TEXT PRIMARY KEY,'
+        '  name TEXT NOT NULL,'
+        '  seen TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP'
+        ');'
+    )
+
+
+def get_narration_db():
+    """
+    Return this thread's connection to the narration store. The tables are
+    created once per process, by whichever thread connects first.
+    """
+    global _schema_ready
+    db = getattr(_local, 'db', None)
+    if db is None:
+        os.makedirs(os.path.dirname(NARRATION_DB), exist_ok=True)
+        db = sqlite3.connect(NARRATION_DB, timeout=10)
+        with _schema_lock:
+            if not _schema_ready:
+                _create_schema(db)
+                _schema_ready = True
+        _local.db = db
+    return db
+
+
+def get_cached(names: list) -> dict:
+    """Return the stored narrations for names under the current prompt version."""
+    keys = {_species_key(name): name for name in names}
+    if not keys:
+        return {}
+    db = get_narration_db()
+    rows = db.execute(
+        f'SELECT species, body FROM narration'
+        f' WHERE prompt_version = ? AND species IN ({",".join("?" * len(keys))})',
+        (PROMPT_VERSION, *keys)
+    ).fetchall()
+    return {keys[species]: body for species, body in rows}
+
+
+def store_narrations(narrations: dict):
+    """Save narrations keyed by species name under the current prompt version."""
+    db = get_narration_db()
+    with db:
+        db.executemany(
+            'INSERT OR REPLACE INTO narration (species, prompt_version, name, body)'
+            ' VALUES (?, ?, ?, ?)',
+            [(_species_key(name), PROMPT_VERSION, name, body) for name, body in narrations.items()]
+        )
+
+
+def record_species(names: list):
+    """Remember species returned by /explore so their narrations can be pre-generated."""
+    if not names:
+        return
+    db = get_narration_db()
+    with db:
+        db.executemany(
+            'INSERT OR REPLACE INTO recent_species (species, name, seen)'
+            ' VALUES (?, ?, CURRENT_TIMESTAMP)',
+            [(_species_key(name), name) for name in names]
+        )
+
+
+def recent_species(days: int = 7) -> list:
+    """Species surfaced by /explore within the last number of days."""
+    db = get_narration_db()
+    rows = db.execute(
+        "SELECT name FROM recent_species WHERE seen >= datetime('now', ?)"
+        ' ORDER BY seen DESC',
+        (f'-{days} days',)
+    ).fetchall()
+    return [name for (name,) in rows]
+
+
+def narrate(name: str, refresh: bool = False) -> str:
+
+    if not refresh:
+        cached = get_cached([name])
+        if name in cached:
+            return cached[name]
+
+    response = get_model().generate_content(PROMPT.format(name=name))
+
+    store_narrations({name: response.text})
     return response.text
 
 
+def narrate_stream(name: str):
+    """Yield the narration for name in chunks as the model produces them."""
+    cached = get_cached([name])
+    if name in cached:
+        yield cached[name]
+        return
+
+    parts = []
+    for chunk in get_model().generate_content(PROMPT.format(name=name), stream=True):
+        parts.append(chunk.text)
+        yield chunk.text
+
+    store_narrations({name: "".join(parts)})
+
+
+def generate_batch(names: list) -> dict:
+    """Generate narrations for several species in one request."""
+    response = get_model().generate_content(
+        BATCH_PROMPT.format(names="\n".join(f"- {name}" for name in names)),
+        generation_config={"response_mime_type": "application/json"}
+    )
+    entries = json.loads(response.text).get("narrations", [])
+
+    by_key = {_species_key(name): name for name in names}
+    narrations = {}
+    for entry in entries:
+        name = by_key.get(_species_key(str(entry.get("species", ""))))
+        if name and entry.get("narration"):
+            narrations[name] = entry["narration"].strip()
+    return narrations
+
+
+def narrate_many(names: list, batch_size: int = BATCH_SIZE, refresh: bool = False) -> dict:
+    """
+    Narrate many species, serving stored narrations from the cache and generating
+    the rest in batched requests. Species a batch response leaves out fall back to
+    a single narrate() call; species that still fail are left out of the result.
+    """
+    names = list(dict.fromkeys(names))
+    narrations = {} if refresh else get_cached(names)
+    missing = [name for name in names if name not in narrations]
+
+    for i in range(0, len(missing), batch_size):
+        batch = missing[i:i + batch_size]
+        try:
+            generated = generate_batch(batch)
+        except Exception as e:
+            print(f"Error generating narration batch: {e}")
+            generated = {}
+        store_narrations(generated)
+        narrations.update(generated)
+
+        for name in batch:
+            if name in narrations:
+                continue
+            try:
+                narrations[name] = narrate(name, refresh=True)
+            except Exception as e:
+                print(f"Error generating narration for {name}: {e}")
+
+    return narrations
+
+
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description="Pre-generate species narrations.")
+    parser.add_argument("species", nargs="*", help="species names to narrate")
+    parser.add_argument("--recent", action="store_true", help="include species surfaced by recent /explore calls")
+    parser.add_argument("--days", type=int, default=7, help="how far back --recent looks")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--refresh", action="store_true", help="regenerate narrations that are already stored")
+    args = parser.parse_args()
+
+    names = list(args.species)
+    if args.recent:
+        names += recent_species(args.days)
+    if not names:
+        names = ["Red Panda"]
+
     start = time()
 
-    print(narrate("Red Panda"))
+    narrations = narrate_many(names, batch_size=args.batch_size, refresh=args.refresh)
+    for name, text in narrations.items():
+        print(f"{name}: {len(text.split())} words")
 
     end = time()
 
-    print(end - start)
\ No newline at end of file
+    print(end - start)
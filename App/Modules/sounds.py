@@ -0,0 +1,178 @@
+import aiohttp
+import asyncio
+import atexit
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+CLIP_FOLDER = "./Temp/Animal"
+# Clips larger than this are abandoned mid-download
+MAX_CLIP_BYTES = 10 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class SoundClipCache:
+    """
+    Download-once cache for animal sound clips.
+
+    Clips are streamed to disk in chunks and stored under the SHA-256 of their
+    content, so identical clips served from different URLs share a file. A URL
+    index maps each source URL to its content hash.
+
+    Downloads run on an event loop owned by the cache in a background thread, so
+    callers on any loop (each asyncio.run in a request, say) share one pooled
+    session, and concurrent requests for the same URL share a single download.
+    """
+
+    def __init__(self, folder=CLIP_FOLDER, max_bytes=MAX_CLIP_BYTES, timeout=30):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.index_path = os.path.join(folder, "index.json")
+
+        self._lock = threading.Lock()
+        self._index = None
+        self._loop_lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        # Only touched from the cache's own loop
+        self._session = None
+        self._inflight = {}             # url -> Task
+
+    def _load_index(self):
+        # Caller must hold self._lock
+        if self._index is None:
+            try:
+                with open(self.index_path) as f:
+                    self._index = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        # Caller must hold self._lock
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _clip_path(self, digest):
+        return os.path.join(self.folder, f"{digest}.mp3")
+
+    def lookup(self, url):
+        """Return the cached path for a URL, or None if it has not been downloaded"""
+        with self._lock:
+            digest = self._load_index().get(url)
+        if digest is None:
+            return None
+        path = self._clip_path(digest)
+        return path if os.path.isfile(path) else None
+
+    def _ensure_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="clip-cache", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        return self._session
+
+    async def fetch(self, url):
+        """Return a local path for the clip at url, downloading it at most once"""
+        path = self.lookup(url)
+        if path is not None:
+            return path
+
+        future = asyncio.run_coroutine_threadsafe(self._fetch(url), self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    async def _fetch(self, url):
+        # Runs on the cache's loop; re-check in case a download finished meanwhile
+        path = self.lookup(url)
+        if path is not None:
+            return path
+
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._download(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        return await asyncio.shield(task)
+
+    async def _download(self, url):
+        os.makedirs(self.folder, exist_ok=True)
+        tmp_path = os.path.join(self.folder, f"partial_{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        received = 0
+
+        try:
+            async with self._get_session().get(url) as response:
+                if response.status != 200:
+                    raise Exception(f"Failed to download audio: {response.status}")
+                if response.content_length and response.content_length > self.max_bytes:
+                    raise Exception(f"Audio clip too large: {response.content_length} bytes")
+
+                with open(tmp_path, 'wb') as f:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        received += len(chunk)
+                        if received > self.max_bytes:
+                            raise Exception(f"Audio clip exceeds {self.max_bytes} bytes")
+                        digest.update(chunk)
+                        f.write(chunk)
+
+            hex_digest = digest.hexdigest()
+            path = self._clip_path(hex_digest)
+            if os.path.isfile(path):
+                # Same content already cached under another URL
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+
+            with self._lock:
+                self._load_index()[url] = hex_digest
+                self._save_index()
+
+            return path
+        except Exception as e:
+            print(f"Error downloading audio: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+
+    async def _close_session(self):
+        session, self._session = self._session, None
+        if session is not None and not session.closed:
+            await session.close()
+
+    def close(self):
+        """Close the shared session and stop the cache's loop; a later fetch starts a new one"""
+        with self._loop_lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_session(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+_clip_cache = None
+_clip_cache_lock = threading.Lock()
+
+
+def get_clip_cache():
+    """Return the process-wide clip cache"""
+    global _clip_cache
+    with _clip_cache_lock:
+        if _clip_cache is None:
+            _clip_cache = SoundClipCache()
+            atexit.register(_clip_cache.close)
+        return _clip_cache
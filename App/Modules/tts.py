@@ -1,14 +1,25 @@
 import asyncio
 import edge_tts
 import os
+import re
 
-VOICE = 'en-CA-LiamNeural'  
+VOICE = 'en-CA-LiamNeural'
 OUTPUT_FILE = "./Temp/Normal/main.mp3"
+# Sentences synthesized at the same time by speak_stream
+MAX_IN_FLIGHT = 3
+
+# Candidate sentence ends; the lookahead holds a break back until the next word arrives
+SENTENCE_END = re.compile(r'[.!?]["\')\]]*\s+(?=\S)')
+# Words whose trailing period does not end the sentence
+ABBREVIATIONS = {"e.g", "i.e", "cf", "vs", "approx", "ca", "dr", "mr", "mrs", "ms", "prof", "st", "sr", "jr"}
+
+def _communicate(text):
+    return edge_tts.Communicate(text, VOICE, rate="-15%", pitch="-5Hz", volume="+20%")
 
 async def generate_speech(text, output_file=OUTPUT_FILE):
     """Generate speech from text and save to file"""
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    communicate = edge_tts.Communicate(text, VOICE, rate="-15%", pitch="-5Hz", volume="+20%")
+    communicate = _communicate(text)
     await communicate.save(output_file)
     return output_file
 
@@ -16,6 +27,98 @@ async def speak(text, output_file=OUTPUT_FILE):
     """Wrapper for generate_speech to be used with asyncio"""
     return await generate_speech(text, output_file)
 
+async def _iterate(chunks):
+    """Iterate sync or async text chunks without blocking the event loop"""
+    if hasattr(chunks, '__aiter__'):
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    iterator = iter(chunks)
+    done = object()
+    while True:
+        # Blocking LLM streams are pulled from a worker thread
+        chunk = await asyncio.to_thread(next, iterator, done)
+        if chunk is done:
+            return
+        yield chunk
+
+def _is_sentence_end(text, match):
+    """Whether a SENTENCE_END match really ends a sentence rather than an abbreviation"""
+    if text[match.start()] == '.':
+        word = re.search(r'(\S*)$', text[:match.start()]).group(1).lstrip('"\'([').lower()
+        if word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+            return False
+    return not text[match.end()].islower()
+
+async def split_sentences(chunks):
+    """Regroup streamed text chunks into whole sentences"""
+    buffer = ""
+    async for chunk in _iterate(chunks):
+        buffer += chunk
+        start = 0
+        for match in SENTENCE_END.finditer(buffer):
+            if _is_sentence_end(buffer, match):
+                sentence = buffer[start:match.end()].strip()
+                if sentence:
+                    yield sentence
+                start = match.end()
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer.strip()
+
+async def synthesize(text, semaphore=None):
+    """Synthesize text and return the MP3 bytes"""
+    async with semaphore or asyncio.Semaphore(1):
+        audio = bytearray()
+        async for message in _communicate(text).stream():
+            if message["type"] == "audio":
+                audio.extend(message["data"])
+        return bytes(audio)
+
+async def speak_stream(chunks, output_file=OUTPUT_FILE, max_in_flight=MAX_IN_FLIGHT, on_audio=None):
+    """
+    Synthesize a streamed narration sentence by sentence.
+
+    Each sentence is sent to TTS as soon as it is complete, while later text is
+    still arriving, and the resulting MP3 frames are appended to output_file in
+    sentence order. on_audio, if given, is called with each sentence's audio as
+    soon as it can be played, so the first audio depends only on the first sentence.
+    """
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    semaphore = asyncio.Semaphore(max_in_flight)
+    pending = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for sentence in split_sentences(chunks):
+                await pending.put(asyncio.ensure_future(synthesize(sentence, semaphore)))
+        finally:
+            await pending.put(None)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        with open(output_file, 'wb') as f:
+            while True:
+                task = await pending.get()
+                if task is None:
+                    break
+                audio = await task
+                f.write(audio)
+                f.flush()
+                if on_audio is not None:
+                    on_audio(audio)
+        await producer
+    except BaseException:
+        producer.cancel()
+        while not pending.empty():
+            task = pending.get_nowait()
+            if task is not None:
+                task.cancel()
+        raise
+
+    return output_file
+
 def speak_sync(text, output_file=OUTPUT_FILE):
     """Synchronous wrapper for speak"""
     loop = asyncio.new_event_loop()
@@ -26,4 +129,4 @@ def speak_sync(text, output_file=OUTPUT_FILE):
         loop.close()
 
 if __name__ == "__main__":
-    speak_sync(input("> "))
\ No newline at end of file
+    speak_sync(input("> "))
@@ -1,21 +1,32 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 import json
 import concurrent.futures
 import asyncio
 import os
+import queue
+import uuid
 
 from Modules.news import get_news_rss
 from Modules.animals import API_Response
 from Modules.animal_viz import create_visualization
+from Modules.artifacts import get_store
+from Modules.background import get_library
+from Modules import admission
+from Modules.llm import record_species, narrate_stream
+from Modules.aud import process_audio
 
 # Change the static_folder to point to the correct directory
 app = Flask(__name__, static_folder='../visualizations')
-CORS(app)
+CORS(app, expose_headers=["X-Mixed-Audio"])
 
 # Thread pool for CPU-bound tasks
 executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
 
+# Index the background music now so its tracks are decoded in the background
+# before the first narration needs one
+get_library().refresh()
+
 
 def stream_species_data(species_data):
     """Generator function to stream species JSON one by one, including audio and news."""
@@ -40,6 +51,7 @@ def stream_species_data(species_data):
             yield f"data: {error_data}\n\n"
 
 @app.route("/explore", methods=["POST"]) 
+@admission.admit(max_concurrent=4, max_queue=8, queue_timeout=15, rate=0.2, burst=3)
 def explore():
     """Handles species retrieval based on location and returns JSON response."""
     location = request.json.get('location')
@@ -53,6 +65,12 @@ def explore():
         if "error" in result:
             return jsonify(result), 404
 
+        # Remember surfaced species so their narrations can be pre-generated
+        try:
+            record_species(list(result["species_data"]))
+        except Exception as e:
+            print(f"Error recording species: {str(e)}")
+
         # Process each species data
         processed_data = {}
         for species_name, data in result["species_data"].items():
@@ -79,6 +97,7 @@ def explore():
         return jsonify({'error': f'An error occurred: {str(e)}'}), 500
 
 @app.route('/visualize', methods=['POST'])
+@admission.admit(max_concurrent=2, max_queue=4, queue_timeout=15, rate=0.2, burst=3)
 def visualize_animal():
     try:
         data = request.json
@@ -113,9 +132,66 @@ def serve_visualization(filename):
     print(f"Serving visualization file: {filename}")
     return send_from_directory('../visualizations', filename)
 
+@app.route('/narrate', methods=['POST'])
+@admission.admit(max_concurrent=2, max_queue=4, queue_timeout=15, rate=0.2, burst=3)
+def narrate_animal():
+    """
+    Stream a species narration as MP3 while it is still being written: each sentence
+    is sent as soon as it is synthesized. The narration mixed with the animal's call
+    and background music is saved once it is complete, at the X-Mixed-Audio URL.
+    """
+    data = request.json
+    animal_name = data.get('animal')
+
+    if not animal_name:
+        return jsonify({'success': False, 'error': 'Animal name is required'})
+
+    filename = f"mixed_{uuid.uuid4().hex}.mp3"
+    chunks = queue.Queue()
+    done = object()
+
+    def produce():
+        try:
+            asyncio.run(process_audio(
+                narrate_stream(animal_name), data.get('audio_urls'),
+                on_audio=chunks.put, output_filename=filename
+            ))
+        finally:
+            chunks.put(done)
+
+    executor.submit(produce)
+
+    def stream():
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                return
+            yield chunk
+
+    response = Response(stream(), mimetype='audio/mpeg')
+    response.headers['X-Mixed-Audio'] = f"http://localhost:5000/audio/{filename}"
+    return response
+
+@app.route('/audio/<path:filename>')
+def serve_audio(filename):
+    # Serve mixed narrations written by process_audio
+    return send_from_directory(os.path.abspath('./Temp/Mixed'), filename)
+
 @app.route("/api/health")
 def health_check():
     return jsonify({"status": "ok"})
 
+@app.route("/api/temp-usage")
+def temp_usage():
+    """Disk usage and eviction counters for the ./Temp working directories"""
+    usage = get_store().usage()
+    usage["background_cache"] = get_library().stats()
+    return jsonify(usage)
+
+@app.route("/api/admission")
+def admission_stats():
+    """Queue wait times and rejections for the rate-limited endpoints"""
+    return jsonify(admission.stats())
+
 if __name__ == "__main__":
     app.run(debug=True, threaded=True)
\ No newline at end of file
@@ -0,0 +1,55 @@
+import pytest
+from werkzeug.security import generate_password_hash
+from Blog import create_app
+from Blog.db import discard_db, get_db, init_db
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'DATABASE': str(tmp_path / 'blog.sqlite'),
+    })
+    app.static_folder = str(tmp_path / 'static')
+
+    with app.app_context():
+        init_db()
+        db = get_db()
+        db.executemany(
+            'INSERT INTO user (email, username, password) VALUES (?, ?, ?)',
+            [
+                ('test@example.com', 'test', generate_password_hash('test')),
+                ('other@example.com', 'other', generate_password_hash('other')),
+            ]
+        )
+        db.commit()
+
+    yield app
+
+    with app.app_context():
+        discard_db()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class AuthActions:
+    """Log the test client in by session, without going through the password pool."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def login(self, user_id=1):
+        with self._client.session_transaction() as session:
+            session['user_id'] = user_id
+
+    def logout(self):
+        with self._client.session_transaction() as session:
+            session.clear()
+
+
+@pytest.fixture
+def auth(client):
+    return AuthActions(client)
@@ -0,0 +1,61 @@
+import pytest
+from Blog.cache import ResponseCache, get_cache, get_user_cache
+from Blog.db import get_db
+
+
+@pytest.fixture
+def post(client, auth):
+    auth.login()
+    return client.post('/create', data={'title': 'Cached', 'body': 'Body'}).get_json()['post_id']
+
+
+def test_repeat_reads_are_served_from_cache(client, post, app):
+    client.get(f'/{post}/view')
+    client.get(f'/{post}/view')
+    with app.app_context():
+        stats = get_cache().stats()
+    assert stats['hits'] == 1
+    assert stats['entries'] >= 1
+
+
+def test_update_invalidates_cached_views(client, post, app):
+    assert client.get(f'/{post}/view').get_json()['post']['title'] == 'Cached'
+    assert client.get('/').get_json()['posts'][0]['title'] == 'Cached'
+
+    client.post(f'/{post}/update', data={'title': 'Changed', 'body': 'Body'})
+    assert client.get(f'/{post}/view').get_json()['post']['title'] == 'Changed'
+    assert client.get('/').get_json()['posts'][0]['title'] == 'Changed'
+
+
+def test_write_from_elsewhere_is_not_served_stale(client, post, app):
+    client.get(f'/{post}/view')
+    # A write that never calls invalidate(), as another process would make it
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET title = 'Elsewhere' WHERE id = ?", (post,))
+        db.commit()
+    assert client.get(f'/{post}/view').get_json()['post']['title'] == 'Elsewhere'
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_bytes=10)
+    cache.put('a', 'e1', None, 'application/json', b'12345', ['feed'])
+    cache.put('b', 'e1', None, 'application/json', b'12345', ['post:1'])
+    cache.get('a', 'e1')
+    cache.put('c', 'e1', None, 'application/json', b'12345', ['post:2'])
+    assert cache.get('a', 'e1') is not None
+    assert cache.get('b', 'e1') is None
+    cache.invalidate('feed')
+    assert cache.get('a', 'e1') is None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_profile_edit_forgets_cached_user(client, auth, app):
+    auth.login()
+    client.get('/auth/profile')
+    with app.app_context():
+        assert get_user_cache().get(1) is not None
+    client.post('/auth/profile/edit', data={'bio': 'New bio'})
+    with app.app_context():
+        assert get_user_cache().get(1) is None
+    assert client.get('/auth/profile').get_json()['user']['bio'] == 'New bio'
@@ -0,0 +1,45 @@
+import pytest
+from Blog.content import EXCERPT_LENGTH, backfill_post_summaries, sanitize, summarize
+from Blog.db import get_db
+
+
+@pytest.mark.parametrize(('body', 'expected'), [
+    ('<p>Hi <strong>there</strong></p>', '<p>Hi <strong>there</strong></p>'),
+    ('<script>alert(1)</script><p>ok</p>', 'alert(1)<p>ok</p>'),
+    ('<a href="https://example.com" onclick="x()">link</a>', '<a href="https://example.com">link</a>'),
+    ('<img src=x onerror=alert(1)>', ''),
+])
+def test_sanitize(body, expected):
+    assert sanitize(body) == expected
+
+
+def test_summarize():
+    assert summarize('<p>Tigers &amp; <em>lions</em></p>') == ('Tigers & lions', 3)
+    excerpt, words = summarize('<p>' + 'word ' * 200 + '</p>')
+    assert words == 200
+    assert len(excerpt) <= EXCERPT_LENGTH + 1
+    assert excerpt.endswith('word…')
+
+
+def test_posts_are_stored_sanitized_with_excerpt(client, auth, app):
+    auth.login()
+    client.post('/create', data={'title': 'T', 'body': '<p onclick="x()">Hello <b>big</b> world</p>'})
+    post = client.get('/').get_json()['posts'][0]
+    assert post['excerpt'] == 'Hello big world'
+    assert post['word_count'] == 3
+    assert 'body' not in post
+    assert client.get('/1/view').get_json()['post']['body'] == '<p>Hello big world</p>'
+
+
+def test_backfill_post_summaries(app):
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (author_id, title, body) VALUES (1, ?, ?)',
+            [(f'Post {i}', f'<p>Post number {i}</p><script>bad()</script>') for i in range(5)]
+        )
+        backfill_post_summaries(db, batch_size=2)
+        rows = db.execute('SELECT body, excerpt, word_count FROM post ORDER BY id').fetchall()
+    assert [tuple(row) for row in rows] == [
+        (f'<p>Post number {i}</p>bad()', f'Post number {i} bad()', 4) for i in range(5)
+    ]
@@ -0,0 +1,60 @@
+import sqlite3
+import pytest
+from Blog import create_app
+from Blog.db import MIGRATIONS, get_db, latest_version, schema_version
+
+
+def test_init_db_applies_every_migration(app):
+    with app.app_context():
+        assert schema_version(get_db()) == latest_version() == MIGRATIONS[-1][0]
+
+
+def legacy_database(path):
+    """A database created from schema.sql alone, before any migration existed."""
+    app = create_app({'TESTING': True, 'DATABASE': str(path)})
+    with app.open_resource('schema.sql') as f:
+        schema = f.read().decode('utf8')
+    db = sqlite3.connect(path)
+    db.executescript(schema)
+    db.execute(
+        "INSERT INTO user (email, username, password) VALUES ('a@example.com', 'a', 'x')"
+    )
+    db.execute("INSERT INTO post (author_id, title, body) VALUES (1, 'Old', '<p>Old post</p>')")
+    db.commit()
+    db.close()
+
+
+def test_existing_database_is_migrated_on_startup(tmp_path):
+    path = tmp_path / 'legacy.sqlite'
+    legacy_database(path)
+
+    app = create_app({'TESTING': True, 'DATABASE': str(path)})
+    with app.app_context():
+        db = get_db()
+        assert schema_version(db) == latest_version()
+        post = db.execute('SELECT excerpt, word_count FROM post').fetchone()
+        assert post['word_count'] == 2
+        assert db.execute('SELECT post_count FROM user').fetchone()[0] == 1
+
+    response = app.test_client().get('/')
+    assert response.status_code == 200
+
+
+def test_startup_fails_fast_without_auto_migration(tmp_path):
+    path = tmp_path / 'legacy.sqlite'
+    legacy_database(path)
+
+    with pytest.raises(RuntimeError, match='migrate-db'):
+        create_app({'TESTING': True, 'DATABASE': str(path), 'MIGRATE_ON_STARTUP': False})
+
+
+def test_migrate_db_command(tmp_path):
+    path = tmp_path / 'legacy.sqlite'
+    app = create_app({'TESTING': True, 'DATABASE': str(path)})
+    legacy_database(path)
+
+    # The flask command pushes an app context before running commands; the test runner doesn't
+    with app.app_context():
+        result = app.test_cli_runner().invoke(args=['migrate-db'])
+        assert f'schema version {latest_version()}' in result.output
+        assert schema_version(get_db()) == latest_version()
@@ -0,0 +1,99 @@
+import io
+import os
+import time
+import pytest
+from PIL import Image
+from Blog.db import get_db
+
+
+def png(width, height, color='red'):
+    data = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(data, 'PNG')
+    data.seek(0)
+    return data
+
+
+def upload(client, title, data, name='a.png'):
+    return client.post(
+        '/create', data={'title': title, 'body': 'Body', 'images': (data, name)},
+        content_type='multipart/form-data'
+    )
+
+
+def wait_for_variants(app, url, timeout=5):
+    deadline = time.monotonic() + timeout
+    with app.app_context():
+        while time.monotonic() < deadline:
+            row = get_db().execute('SELECT variants FROM image WHERE url = ?', (url,)).fetchone()
+            if row and row['variants']:
+                return
+            time.sleep(0.05)
+    pytest.fail(f'variants of {url} were never recorded')
+
+
+def test_same_bytes_are_stored_once(client, auth, app):
+    auth.login()
+    first = upload(client, 'A', png(800, 600)).get_json()['uploaded_images']
+    second = upload(client, 'B', png(800, 600), 'b.png').get_json()['uploaded_images']
+    assert first == second
+    wait_for_variants(app, first[0])
+    assert sorted(os.listdir(os.path.join(app.static_folder, 'uploads'))) == sorted(
+        os.path.basename(first[0]).replace('.png', suffix)
+        for suffix in ('.png', '_320.webp', '_640.webp')
+    )
+
+
+def test_invalid_image_is_400(client, auth):
+    auth.login()
+    response = upload(client, 'A', io.BytesIO(b'GIF89a not really'), 'a.gif')
+    assert response.status_code == 400
+
+
+def test_oversized_image_is_400(client, auth, app, monkeypatch):
+    auth.login()
+    app.config['MAX_IMAGE_PIXELS'] = 100 * 100
+    response = upload(client, 'A', png(200, 200))
+    assert response.status_code == 400
+    assert 'too many pixels' in response.get_json()['error']
+    assert not os.path.exists(os.path.join(app.static_folder, 'uploads'))
+
+    # Past Pillow's own limit, opening the image already fails
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    assert upload(client, 'B', png(200, 200)).status_code == 400
+
+
+def test_files_go_when_the_last_post_using_them_does(client, auth, app):
+    auth.login()
+    url = upload(client, 'A', png(200, 200)).get_json()['uploaded_images'][0]
+    upload(client, 'B', png(200, 200))
+    path = os.path.join(app.static_folder, url)
+
+    client.post('/1/update', data={'title': 'A', 'body': 'Body', 'remove_images': url})
+    assert os.path.exists(path)
+    client.post('/2/delete')
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize('target', ['../victim.txt', 'uploads/../../victim.txt'])
+def test_remove_images_cannot_delete_other_files(client, auth, app, target):
+    auth.login()
+    upload(client, 'A', png(200, 200))
+    victim = os.path.normpath(os.path.join(app.static_folder, target))
+    os.makedirs(os.path.dirname(victim), exist_ok=True)
+    with open(victim, 'w') as f:
+        f.write('keep me')
+
+    response = client.post('/1/update', data={'title': 'A', 'body': 'Body', 'remove_images': target})
+    assert response.status_code == 200
+    assert os.path.exists(victim)
+
+
+def test_release_images_ignores_paths_outside_uploads(app):
+    from Blog.images import release_images
+    victim = os.path.join(app.static_folder, 'keep.txt')
+    os.makedirs(app.static_folder, exist_ok=True)
+    with open(victim, 'w') as f:
+        f.write('keep me')
+    with app.app_context():
+        release_images(get_db(), ['keep.txt', 'uploads/../keep.txt'])
+    assert os.path.exists(victim)
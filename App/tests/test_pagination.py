@@ -0,0 +1,85 @@
+import pytest
+from Blog.db import get_db
+
+
+@pytest.fixture
+def posts(app):
+    """25 posts alternating between the two users, each with a comment per user."""
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (author_id, title, body, created) VALUES (?, ?, ?, ?)',
+            [(i % 2 + 1, f'Post {i}', 'Body', f'2024-01-01 00:00:{i:02d}') for i in range(25)]
+        )
+        db.executemany(
+            'INSERT INTO comment (post_id, author_id, body) VALUES (?, ?, ?)',
+            [(1, i % 2 + 1, f'Comment {i}') for i in range(7)]
+        )
+        db.commit()
+    return app
+
+
+def test_author_listing_filters_every_page(client, posts):
+    seen = []
+    cursor = None
+    while True:
+        query = {'limit': 4, **({'cursor': cursor} if cursor else {})}
+        page = client.get('/user/2/posts', query_string=query).get_json()
+        seen += [post['author_id'] for post in page['posts']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert seen == [2] * 12
+
+
+def test_comments_of_missing_post_is_404(client, posts):
+    assert client.get('/999/comments').status_code == 404
+    assert client.get('/1/comments').status_code == 200
+
+
+def walk(client, url, key='posts', **query):
+    """Follow next_cursor from the first page to the last, collecting every item."""
+    items, pages = [], 0
+    cursor = None
+    while True:
+        page = client.get(url, query_string={**query, **({'cursor': cursor} if cursor else {})}).get_json()
+        items += page[key]
+        pages += 1
+        cursor = page['next_cursor']
+        if cursor is None:
+            return items, pages
+
+
+def test_feed_cursor_visits_every_post_once_newest_first(client, posts):
+    items, pages = walk(client, '/', limit=10)
+    assert [post['title'] for post in items] == [f'Post {i}' for i in reversed(range(25))]
+    assert pages == 3
+
+
+def test_cursor_is_stable_under_inserts(client, posts, app):
+    first = client.get('/', query_string={'limit': 5}).get_json()
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO post (author_id, title, body, created) VALUES (1, 'Newer', 'Body', '2024-02-01')"
+        )
+        db.commit()
+    second = client.get('/', query_string={'limit': 5, 'cursor': first['next_cursor']}).get_json()
+    assert [post['title'] for post in second['posts']] == [f'Post {i}' for i in range(19, 14, -1)]
+
+
+def test_comment_cursor(client, posts):
+    items, _ = walk(client, '/1/comments', key='comments', limit=3)
+    assert len(items) == 7
+    assert len({comment['id'] for comment in items}) == 7
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', 'WzEsMiwzXQ'])
+def test_malformed_cursor_is_400(client, posts, cursor):
+    assert client.get('/', query_string={'cursor': cursor}).status_code == 400
+
+
+def test_page_size_is_clamped(client, posts, app):
+    app.config['MAX_PAGE_SIZE'] = 5
+    page = client.get('/', query_string={'limit': 1000}).get_json()
+    assert len(page['posts']) == 5
@@ -0,0 +1,51 @@
+import pytest
+from Blog.db import get_db, hot_path_queries, plan_scans
+
+
+@pytest.fixture
+def seeded(app):
+    """Enough posts, images and comments that every hot path has rows to walk."""
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (author_id, title, body) VALUES (?, ?, ?)',
+            [(i % 2 + 1, f'Post {i}', 'Body') for i in range(30)]
+        )
+        db.executemany(
+            'INSERT INTO post_images (post_id, image_url) VALUES (?, ?)',
+            [(i + 1, f'uploads/plan-{i}.jpg') for i in range(30)]
+        )
+        db.executemany(
+            'INSERT INTO comment (post_id, author_id, body) VALUES (?, ?, ?)',
+            [(i % 30 + 1, i % 2 + 1, 'Comment') for i in range(90)]
+        )
+        db.commit()
+    return app
+
+
+def test_hot_queries_use_indexes(seeded, client, auth):
+    auth.login()
+    queries = hot_path_queries(seeded, client)
+    assert queries
+
+    with seeded.app_context():
+        db = get_db()
+        scans = {sql: plan_scans(db, sql) for sql in queries}
+    assert {sql: steps for sql, steps in scans.items() if steps} == {}
+
+
+def test_plan_scans_flags_a_full_scan(app):
+    with app.app_context():
+        db = get_db()
+        assert plan_scans(db, "SELECT * FROM post WHERE body = 'x'") == ['SCAN post']
+        assert plan_scans(db, 'SELECT * FROM post WHERE id = 1') == []
+
+
+def test_plan_scans_flags_index_scans(app):
+    with app.app_context():
+        db = get_db()
+        ordered = 'SELECT * FROM post ORDER BY created DESC LIMIT 5'
+        assert plan_scans(db, ordered) == ['SCAN post USING INDEX idx_post_created']
+        covering = 'SELECT id FROM post ORDER BY created DESC LIMIT 5'
+        assert plan_scans(db, covering) == []
+        assert plan_scans(db, covering, allowed=set()) == ['SCAN post USING COVERING INDEX idx_post_created']
@@ -0,0 +1,42 @@
+import pytest
+
+
+@pytest.fixture
+def content(client, auth):
+    auth.login()
+    client.post('/create', data={
+        'title': 'Tigers <script>alert(1)</script>',
+        'body': '<p><strong>Tigers</strong> &amp; stripes <a href="https://tigers.example">everywhere</a></p>',
+    })
+    client.post('/post/1/comment', data={'body': '<img src=x onerror=alert(1)> tigers'})
+
+
+def test_search_finds_posts_and_comments(client, content):
+    result = client.get('/search', query_string={'q': 'tiger', 'scope': 'all'}).get_json()
+    assert [post['id'] for post in result['posts']] == [1]
+    assert [comment['id'] for comment in result['comments']] == [1]
+
+
+def test_highlights_escape_user_markup(client, content):
+    result = client.get('/search', query_string={'q': 'tigers', 'scope': 'all'}).get_json()
+    post = result['posts'][0]
+    assert post['title_highlight'] == '<mark>Tigers</mark> &lt;script&gt;alert(1)&lt;/script&gt;'
+    assert post['snippet'] == '<mark>Tigers</mark> &amp; stripes everywhere'
+    assert result['comments'][0]['snippet'] == '&lt;img src=x onerror=alert(1)&gt; <mark>tigers</mark>'
+
+
+def test_search_requires_a_query(client):
+    assert client.get('/search', query_string={'q': '  '}).status_code == 400
+    assert client.get('/search', query_string={'q': 'x', 'scope': 'nope'}).status_code == 400
+
+
+def test_markup_is_not_searchable(client, auth):
+    auth.login()
+    client.post('/create', data={
+        'title': 'Greeting',
+        'body': '<p><strong>Hello</strong> <a href="https://example.com/zebra">link</a></p>',
+    })
+    for word in ('strong', 'href', 'example', 'zebra'):
+        assert client.get('/search', query_string={'q': word}).get_json()['posts'] == []
+    for word in ('hello', 'link'):
+        assert [post['id'] for post in client.get('/search', query_string={'q': word}).get_json()['posts']] == [1]
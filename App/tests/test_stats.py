@@ -0,0 +1,55 @@
+from Blog.db import get_db, recount_user_stats
+
+
+def counts(app, user_id=1):
+    with app.app_context():
+        row = get_db().execute(
+            'SELECT post_count, comment_count FROM user WHERE id = ?', (user_id,)
+        ).fetchone()
+    return tuple(row)
+
+
+def test_triggers_track_posts_and_comments(client, auth, app):
+    auth.login()
+    post_id = client.post('/create', data={'title': 'A', 'body': 'B'}).get_json()['post_id']
+    client.post('/create', data={'title': 'C', 'body': 'D'})
+    client.post(f'/post/{post_id}/comment', data={'body': 'Hi'})
+    assert counts(app) == (2, 1)
+
+    client.post('/comment/1/delete')
+    client.post(f'/{post_id}/delete')
+    assert counts(app) == (1, 0)
+
+    stats = client.get('/auth/profile').get_json()['user']['stats']
+    assert (stats['posts'], stats['comments']) == (1, 0)
+
+
+def test_moving_a_post_moves_the_count(app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO post (author_id, title, body) VALUES (1, 'A', 'B')")
+        db.execute('UPDATE post SET author_id = 2')
+        db.commit()
+    assert counts(app, 1) == (0, 0)
+    assert counts(app, 2) == (1, 0)
+
+
+def test_repair_user_stats(app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO post (author_id, title, body) VALUES (1, 'A', 'B')")
+        db.execute('UPDATE user SET post_count = 40, comment_count = 3')
+        db.commit()
+        assert recount_user_stats(db) == 2
+        db.commit()
+    assert counts(app, 1) == (1, 0)
+
+    with app.app_context():
+        result = app.test_cli_runner().invoke(args=['repair-user-stats'])
+    assert 'Corrected counters for 0 users' in result.output
+
+
+def test_metrics_cover_every_cache(client):
+    metrics = client.get('/metrics').get_json()
+    assert set(metrics) == {'response_cache', 'user_cache', 'passwords', 'google_oauth'}
+    assert set(metrics['google_oauth']) == {'fetches', 'hits', 'cached'}
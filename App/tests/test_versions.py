@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone
+from werkzeug.http import http_date
+from Blog import versions
+from Blog.db import get_db
+
+
+def create_post(client, auth, title='Hello'):
+    auth.login()
+    response = client.post('/create', data={'title': title, 'body': 'Body'})
+    assert response.status_code == 200
+    return response.get_json()['post_id']
+
+
+def test_matching_etag_gets_304(client, auth):
+    post_id = create_post(client, auth)
+    first = client.get(f'/{post_id}/view')
+    assert first.status_code == 200
+    assert first.headers['ETag']
+    assert 'no-cache' in first.headers['Cache-Control']
+
+    again = client.get(f'/{post_id}/view', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+
+
+def set_modified(app, when):
+    with app.app_context():
+        db = get_db()
+        db.execute('UPDATE data_version SET modified = ?', (when.strftime('%Y-%m-%d %H:%M:%S'),))
+        db.commit()
+
+
+def test_if_modified_since_gets_304(client, auth, app, monkeypatch):
+    create_post(client, auth)
+    written = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+    set_modified(app, written)
+    monkeypatch.setattr(versions, 'utcnow', lambda: written + timedelta(seconds=2))
+
+    first = client.get('/')
+    assert first.headers['Last-Modified'] == http_date(written)
+    again = client.get('/', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert again.status_code == 304
+
+
+def test_write_in_the_same_second_is_not_hidden(client, auth, app, monkeypatch):
+    post_id = create_post(client, auth)
+    written = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+    monkeypatch.setattr(versions, 'utcnow', lambda: written + timedelta(milliseconds=500))
+
+    set_modified(app, written)
+    first = client.get('/')
+    assert first.status_code == 200
+    assert 'Last-Modified' not in first.headers
+
+    client.post(f'/post/{post_id}/comment', data={'body': 'New comment'})
+    set_modified(app, written)
+    again = client.get('/', headers={'If-Modified-Since': http_date(written)})
+    assert again.status_code == 200
+    assert again.headers['ETag'] != first.headers['ETag']
+
+
+def test_etag_changes_after_a_write(client, auth):
+    post_id = create_post(client, auth)
+    etag = client.get(f'/{post_id}/view').headers['ETag']
+
+    client.post(f'/post/{post_id}/comment', data={'body': 'New comment'})
+    response = client.get(f'/{post_id}/view', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['comments'][0]['body'] == 'New comment'
+
+
+def test_etag_depends_on_the_url(client, auth):
+    create_post(client, auth)
+    assert client.get('/').headers['ETag'] != client.get('/?limit=1').headers['ETag']
+
+
+def test_username_change_refreshes_every_view(client, auth, app):
+    post_id = create_post(client, auth)
+    etag = client.get(f'/{post_id}/view').headers['ETag']
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE user SET username = 'renamed' WHERE id = 1")
+        db.commit()
+    response = client.get(f'/{post_id}/view', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['post']['username'] == 'renamed'
@@ -8,7 +8,9 @@ from datetime import datetime
 # Import our modules
 from llm import generate_narration
 
-from video import process_video
+from video import process_video, RENDER_MODES, RENDER_MIXDOWN, RENDER_FILTERGRAPH
+import timeline
+from artifacts import Holds, get_store
 
 # Set page config
 st.set_page_config(page_title="VR Video Narration Generator", layout="wide")
@@ -32,9 +34,18 @@ if 'voice' not in st.session_state:
     st.session_state.voice = 'en-CA-LiamNeural'
 if 'conversion_mode' not in st.session_state:
     st.session_state.conversion_mode = "narration_only"
+if 'schedule_policy' not in st.session_state:
+    st.session_state.schedule_policy = timeline.GAP
+if 'narration_schedule' not in st.session_state:
+    st.session_state.narration_schedule = []
+if 'render_mode' not in st.session_state:
+    st.session_state.render_mode = RENDER_MIXDOWN
 
 if 'vr_output' not in st.session_state:
     st.session_state.vr_output = None
+# Released when Streamlit discards this session's state
+if 'held_artifacts' not in st.session_state:
+    st.session_state.held_artifacts = Holds(get_store())
 
 
 def format_timestamp(seconds: int) -> str:
@@ -55,6 +66,10 @@ def save_uploaded_file(uploaded_file):
     
     return file_path
 
+def hold_artifact(key: str, path: str):
+    """Keep path safe from temp eviction while it is stored in session state under key."""
+    st.session_state.held_artifacts.hold(key, path)
+
 def clear_temp_files():
     """Clear temporary files to save disk space."""
     normal_dir = "./Temp/Normal"
@@ -64,6 +79,9 @@ def clear_temp_files():
         if os.path.isfile(file_path):
             os.remove(file_path)
 
+    # Evict old and oversized artifacts everywhere else under ./Temp
+    get_store().sweep()
+
 st.title("🎬 VR Video Narration Generator")
 
 # Sidebar for navigation and settings
@@ -99,6 +117,29 @@ with st.sidebar:
     if voice != st.session_state.voice:
         st.session_state.voice = voice
 
+    policy_labels = {
+        timeline.GAP: "Delay until the previous line ends",
+        timeline.COMPRESS: "Compress audio to fit",
+        timeline.TEMPO: "Speak faster to fit",
+    }
+    st.session_state.schedule_policy = st.selectbox(
+        "Overlapping Narration",
+        timeline.POLICIES,
+        index=timeline.POLICIES.index(st.session_state.schedule_policy),
+        format_func=policy_labels.get
+    )
+
+    render_labels = {
+        RENDER_MIXDOWN: "Mix in Python (default)",
+        RENDER_FILTERGRAPH: "Single ffmpeg pass (no intermediate MP3s)",
+    }
+    st.session_state.render_mode = st.selectbox(
+        "Audio Rendering",
+        RENDER_MODES,
+        index=RENDER_MODES.index(st.session_state.render_mode),
+        format_func=render_labels.get
+    )
+
     st.header("VR Settings")
     conversion_mode = st.radio(
         "Video Processing Mode",
@@ -142,6 +183,14 @@ with st.sidebar:
 
         st.session_state.conversion_mode = "narration_only"
 
+    st.header("Storage")
+    usage = get_store().usage()
+    st.caption(
+        f"Temp files: {usage['total_bytes'] / (1024 * 1024):.1f} MB "
+        f"(limit {usage['max_total_bytes'] / (1024 * 1024):.0f} MB), "
+        f"{usage['evicted_files']} evicted"
+    )
+
 if page == "Admin Panel":
     st.header("Admin Panel")
     
@@ -155,6 +204,7 @@ if page == "Admin Panel":
         st.session_state.uploaded_video = uploaded_file
         video_path = save_uploaded_file(uploaded_file)
         st.session_state.video_path = video_path
+        hold_artifact('video_path', video_path)
         st.video(video_path)
         st.success(f"Video uploaded: {uploaded_file.name}")
         
@@ -176,6 +226,7 @@ if page == "Admin Panel":
     if bg_music:
         bg_music_path = save_uploaded_file(bg_music)
         st.session_state.bg_music_path = bg_music_path
+        hold_artifact('bg_music_path', bg_music_path)
         st.audio(bg_music_path)
     else:
         st.session_state.bg_music_path = None
@@ -263,21 +314,29 @@ if page == "Admin Panel":
                         audio.voice = st.session_state.voice
                 
                 # Process based on selected mode
+                        schedule = []
                         if st.session_state.conversion_mode == "narration_only":
                     # Original processing
                             processed_video = process_video(
                                 st.session_state.video_path,
                                 st.session_state.narration,
-                                st.session_state.bg_music_path
+                                st.session_state.bg_music_path,
+                                policy=st.session_state.schedule_policy,
+                                schedule=schedule,
+                                render_mode=st.session_state.render_mode
                             )
                             st.session_state.processed_video = processed_video
+                            hold_artifact('processed_video', processed_video)
                 
                         elif st.session_state.conversion_mode == "convert_360":
                     # First add narration
                             narrated_video = process_video(
                                 st.session_state.video_path,
                                 st.session_state.narration,
-                                st.session_state.bg_music_path
+                                st.session_state.bg_music_path,
+                                policy=st.session_state.schedule_policy,
+                                schedule=schedule,
+                                render_mode=st.session_state.render_mode
                             )
                     
                     # Then convert to YouTube 360
@@ -288,7 +347,9 @@ if page == "Admin Panel":
                                     fov=st.session_state.fov
                                 )
                                 st.session_state.processed_video = vr_video
+                                hold_artifact('processed_video', vr_video)
                 
+                        st.session_state.narration_schedule = schedule
                         st.success("Video processed successfully!")
                 
                 # Show preview
@@ -296,6 +357,21 @@ if page == "Admin Panel":
                         st.subheader("Preview")
                         st.video(st.session_state.processed_video)
 
+                        # Where narration ended up relative to the requested timestamps
+                        if schedule:
+                            summary = timeline.summarize(schedule)
+                            st.subheader("Narration Schedule")
+                            st.caption(
+                                f"{summary['shifted']} of {summary['segments']} lines moved, "
+                                f"up to {summary['max_drift_ms'] / 1000:.1f}s late; "
+                                f"{summary['sped_up']} sped up, {summary['overrunning']} cut off at the end"
+                            )
+                            schedule_df = pd.DataFrame(schedule)
+                            schedule_df["requested"] = (schedule_df["requested_ms"] // 1000).map(format_timestamp)
+                            schedule_df["start"] = (schedule_df["start_ms"] // 1000).map(format_timestamp)
+                            schedule_df["drift (s)"] = schedule_df["drift_ms"] / 1000
+                            st.dataframe(schedule_df[["requested", "start", "drift (s)", "speed", "text"]])
+
                 
                         if st.session_state.conversion_mode == "convert_360":
                             st.info("Your video is now ready for YouTube 360° upload. When uploading to YouTube, be sure to check the '360° Video' option in the Advanced Settings.")
@@ -0,0 +1,9 @@
+"""The artifact store is shared with the Flask app; see App/Modules/artifacts.py."""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'App'))
+
+from Modules.artifacts import ArtifactStore, Holds, get_store  # noqa: E402
+
+__all__ = ['ArtifactStore', 'Holds', 'get_store']
@@ -6,9 +6,21 @@ import uuid
 import asyncio
 import edge_tts
 
+from mixdown import compose
+from pydub.effects import speedup
+import timeline
+
 # Default voice
 voice = 'en-CA-LiamNeural'
 
+# Segments synthesized at the same time by synthesize_segments
+MAX_IN_FLIGHT = 4
+# Attempts per segment, waiting RETRY_BACKOFF_S, then twice that, ... between them
+TTS_ATTEMPTS = 3
+RETRY_BACKOFF_S = 0.5
+# Speaking rate relative to the voice's default, in percent
+SPEAKING_RATE = -15
+
 def parse_timestamps(narration: str) -> list:
     """Extract (timestamp_ms, text) from narration."""
     segments = re.findall(r'\[(\d+:\d+:\d+)\]\s*(.*?)(?=\[|$)', narration, re.DOTALL)
@@ -19,7 +31,12 @@ def parse_timestamps(narration: str) -> list:
         parsed.append((start_ms, text.strip()))
     return parsed
 
-async def text_to_speech_async(text: str, output_path: str, selected_voice: str = None) -> str:
+def speaking_rate(speed: float = 1.0) -> str:
+    """edge-tts rate for SPEAKING_RATE sped up by a factor of speed."""
+    return f"{round((100 + SPEAKING_RATE) * speed) - 100:+d}%"
+
+async def text_to_speech_async(text: str, output_path: str, selected_voice: str = None,
+                               rate: str = None) -> str:
     """Convert text to speech using edge-tts asynchronously."""
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
@@ -27,104 +44,148 @@ async def text_to_speech_async(text: str, output_path: str, selected_voice: str
     tts_voice = selected_voice if selected_voice else voice
     
     # Add adjustments for a more Attenborough-like delivery
-    communicate = edge_tts.Communicate(text, tts_voice, rate="-15%", pitch="-5Hz", volume="+20%")
+    communicate = edge_tts.Communicate(text, tts_voice, rate=rate or speaking_rate(), pitch="-5Hz", volume="+20%")
 
     await communicate.save(output_path)
     return output_path
 
-def text_to_speech(text: str, output_path: str) -> str:
-    """Synchronous wrapper for text_to_speech_async."""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+async def _synthesize_segment(text: str, output_path: str, semaphore: asyncio.Semaphore,
+                              attempts: int = TTS_ATTEMPTS, rate: str = None) -> str:
+    """Synthesize one segment, retrying failed or empty results with exponential backoff."""
+    if attempts < 1:
+        raise ValueError(f"attempts must be at least 1, got {attempts}")
+    for attempt in range(attempts):
+        # The slot is only held while synthesizing, not while backing off
+        async with semaphore:
+            try:
+                await text_to_speech_async(text, output_path, voice, rate)
+                if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                    return output_path
+                error = Exception(f"TTS returned no audio for segment: {text}")
+            except Exception as e:
+                error = e
+        if attempt < attempts - 1:
+            delay = RETRY_BACKOFF_S * 2 ** attempt
+            print(f"TTS attempt {attempt + 1} failed ({error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+    raise Exception(f"Failed to generate TTS for segment: {text}") from error
+
+async def synthesize_segments_async(texts: list, output_dir: str,
+                                    max_in_flight: int = MAX_IN_FLIGHT, rates: list = None) -> list:
+    """
+    Synthesize all texts concurrently, at most max_in_flight at a time, optionally
+    each at its own edge-tts rate. Paths come back in input order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    semaphore = asyncio.Semaphore(max_in_flight)
+    rates = rates or [None] * len(texts)
+    tasks = [
+        asyncio.ensure_future(_synthesize_segment(
+            text, f"{output_dir}/segment_{i}_{uuid.uuid4()}.mp3", semaphore, rate=rate
+        ))
+        for i, (text, rate) in enumerate(zip(texts, rates))
+    ]
     try:
-        return loop.run_until_complete(text_to_speech_async(text, output_path, voice))
-    finally:
-        loop.close()
-
-def mix_narration(video_audio_path: str, narration: str, bg_music_path: str = None) -> str:
-    """Overlay TTS segments at specified timestamps without overlapping."""
-
-    # Create temp directory if it doesn't exist
-    temp_dir = "./Temp"
-    normal_dir = os.path.join(temp_dir, "Normal")
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+def synthesize_segments(texts: list, output_dir: str, max_in_flight: int = MAX_IN_FLIGHT,
+                        rates: list = None) -> list:
+    """Synchronous wrapper running every segment on one event loop."""
+    return asyncio.run(synthesize_segments_async(texts, output_dir, max_in_flight, rates))
+
+def prepare_narration(narration: str, work_dir: str, end_ms: int, policy: str = timeline.GAP,
+                      gap_ms: int = timeline.DEFAULT_GAP_MS, stretch_audio: bool = True) -> tuple:
+    """
+    Synthesize the narration and schedule it on a timeline end_ms long.
+
+    Returns (plan, tts_audio): the final timeline.schedule() entries, each with
+    the segment's text, TTS file path and atempo, plus the decoded segments by
+    index. Under COMPRESS the speedup is applied to tts_audio when stretch_audio
+    is set; otherwise it is left to the caller and reported as atempo.
+    """
+    normal_dir = os.path.join(work_dir, "Normal")
     os.makedirs(normal_dir, exist_ok=True)
     
-    # Load video audio
-    video_audio = AudioSegment.from_file(video_audio_path)
-    
     # Parse narration and sort by timestamp
     narration_segments = parse_timestamps(narration)
     narration_segments.sort(key=lambda x: x[0])  # Sort by timestamp
+    texts = [text for _, text in narration_segments]
     
-    # Create a new audio track for narration only
-    narration_track = AudioSegment.silent(duration=len(video_audio))
-    
-    # Process each segment and add to narration track
-    segment_end_times = []  # Track when each segment ends
+    # Generate TTS audio for every segment up front, concurrently
+    tts_files = synthesize_segments(texts, normal_dir)
+    tts_audio = [AudioSegment.from_mp3(tts_file) for tts_file in tts_files]
+
+    plan = timeline.schedule(
+        [(start_ms, len(segment)) for (start_ms, _), segment in zip(narration_segments, tts_audio)],
+        policy, gap_ms, end_ms=end_ms
+    )
+    atempo = [1.0] * len(plan)
+    faster = [p for p in plan if p["speed"] > 1]
+    if faster and policy == timeline.TEMPO:
+        # Speak the segments that don't fit faster rather than distorting the audio
+        resynthesized = synthesize_segments(
+            [texts[p["index"]] for p in faster], normal_dir,
+            rates=[speaking_rate(p["speed"]) for p in faster]
+        )
+        for p, tts_file in zip(faster, resynthesized):
+            tts_files[p["index"]] = tts_file
+            tts_audio[p["index"]] = AudioSegment.from_mp3(tts_file)
+    elif faster and policy == timeline.COMPRESS:
+        for p in faster:
+            if stretch_audio:
+                tts_audio[p["index"]] = speedup(tts_audio[p["index"]], p["speed"])
+            else:
+                atempo[p["index"]] = p["speed"]
+
+    if faster and (policy == timeline.TEMPO or stretch_audio):
+        # Sped-up audio only roughly matches its target length, so place it as it came out
+        speeds = [p["speed"] for p in plan]
+        plan = timeline.schedule(
+            [(start_ms, len(segment)) for (start_ms, _), segment in zip(narration_segments, tts_audio)],
+            timeline.GAP, gap_ms, end_ms=end_ms
+        )
+        for p, speed in zip(plan, speeds):
+            p["speed"] = speed
+
+    for p in plan:
+        i = p["index"]
+        p.update(text=texts[i], path=tts_files[i], atempo=atempo[i])
+        if p["drift_ms"]:
+            print(f"Narration at {p['requested_ms']}ms moved to {p['start_ms']}ms")
+    return plan, tts_audio
+
+def mix_narration(video_audio_path: str, narration: str, bg_music_path: str = None,
+                  work_dir: str = None, policy: str = timeline.GAP,
+                  gap_ms: int = timeline.DEFAULT_GAP_MS, schedule: list = None) -> str:
+    """
+    Overlay TTS segments at specified timestamps without overlapping, resolving
+    collisions with the given timeline policy. If a schedule list is passed, the
+    final placement of every segment is appended to it.
+    """
+
+    # Create temp directory if it doesn't exist
+    temp_dir = work_dir or "./Temp"
     
-    for i, (start_ms, text) in enumerate(narration_segments):
-        # Generate TTS audio with a unique filename for each segment
-        tts_file = f"{normal_dir}/segment_{i}_{uuid.uuid4()}.mp3"
-        text_to_speech(text, tts_file)
-        
-
-        # Check if file was created
-
-        if not os.path.exists(tts_file) or os.path.getsize(tts_file) == 0:
-            raise Exception(f"Failed to generate TTS for segment: {text}")
-            
-        tts_audio = AudioSegment.from_mp3(tts_file)
-        
-        # Check for overlap with previous segments
-        current_end_time = start_ms + len(tts_audio)
-        
-        # If this segment would overlap with any previous segment that's not yet finished,
-        # we need to delay it until the previous segment finishes
-
-        for prev_end in segment_end_times:
-            if start_ms < prev_end:
-                # This segment starts before a previous one ends - adjust start time
-                start_ms = prev_end + 500  # Add 500ms buffer between segments
-                current_end_time = start_ms + len(tts_audio)
-
-                break
-
-        
-        # Add this segment's end time to our tracking list
-        segment_end_times.append(current_end_time)
-        
-
-        # Add narration to the track at the (possibly adjusted) timestamp
-        if start_ms + len(tts_audio) <= len(narration_track):
-            narration_track = narration_track.overlay(tts_audio, position=start_ms)
-        else:
-            # If narration extends beyond video length, trim it
-            tts_audio = tts_audio[:len(narration_track) - start_ms]
-            narration_track = narration_track.overlay(tts_audio, position=start_ms)
+    # Load video audio
+    video_audio = AudioSegment.from_file(video_audio_path)
     
-    # Mix narration track with original audio
-    # Keep original audio but reduce volume when narration is playing
-    video_audio = video_audio - 5  # Reduce original audio by 5dB
+    plan, tts_audio = prepare_narration(narration, temp_dir, len(video_audio), policy, gap_ms)
+    if schedule is not None:
+        schedule.extend(plan)
 
+    # compose() writes every segment into one buffer
+    placements = [(p["start_ms"], tts_audio[p["index"]]) for p in plan]
     
-    # Add narration on top
-    final_audio = video_audio.overlay(narration_track)
-    
-    # Add background music if provided
+    bg_music = None
     if bg_music_path and os.path.exists(bg_music_path):
-        bg_music = AudioSegment.from_file(bg_music_path).fade_in(2000).fade_out(2000) - 15  # -15 dB (lower volume)
-        
-        # Loop music if too short
-
-        if len(bg_music) < len(final_audio):
-            loops_needed = len(final_audio) // len(bg_music) + 1
-            bg_music = bg_music * loops_needed
-        
-        # Trim to match video length
-        bg_music = bg_music[:len(final_audio)]
-        
-        # Overlay
-        final_audio = final_audio.overlay(bg_music)
+        bg_music = AudioSegment.from_file(bg_music_path)
+    
+    # Video sound at -5 dB and looped music at -15 dB, both ducked under the narration
+    final_audio = compose(video_audio, placements, bg_music)
     
     # Export final audio
     output_path = f"{temp_dir}/final_audio_{uuid.uuid4()}.mp3"
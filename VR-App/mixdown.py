@@ -0,0 +1,105 @@
+from pydub import AudioSegment
+import numpy as np
+
+# Levels applied by compose()
+VIDEO_GAIN_DB = -5
+MUSIC_GAIN_DB = -15
+MUSIC_FADE_MS = 2000
+# Extra attenuation of the video sound and music while narration is playing
+DUCK_DB = -6
+DUCK_RAMP_MS = 300
+# Output samples processed per step of the gain pass
+CHUNK_SECONDS = 10
+
+
+def _db_to_gain(db: float) -> float:
+    return 10 ** (db / 20)
+
+
+def _samples(segment: AudioSegment, frame_rate: int, channels: int) -> np.ndarray:
+    """Decode segment as float32 frames of shape (n, channels) in [-1, 1] at the given format."""
+    segment = segment.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(2)
+    samples = np.frombuffer(segment.raw_data, dtype=np.int16).reshape(-1, channels)
+    return samples.astype(np.float32) / 32768
+
+
+def duck_envelope(duration_ms: int, spans: list, duck_db: float = DUCK_DB,
+                  ramp_ms: int = DUCK_RAMP_MS) -> np.ndarray:
+    """
+    Per-millisecond gain for the bed under narration: 1 where nothing is spoken,
+    duck_db while any span (start_ms, end_ms) is playing, with linear ramps between.
+    """
+    edges = np.zeros(duration_ms + 1, dtype=np.int32)
+    for start_ms, end_ms in spans:
+        start_ms, end_ms = max(0, start_ms), min(duration_ms, end_ms)
+        if end_ms > start_ms:
+            edges[start_ms] += 1
+            edges[end_ms] -= 1
+    speaking = (np.cumsum(edges[:-1]) > 0).astype(np.float32)
+
+    if ramp_ms > 0 and speaking.any():
+        # Speech within ramp_ms either side, as a fraction: ramps down over the ramp_ms
+        # before each span starts and back up over the ramp_ms after it ends
+        padding = np.zeros(ramp_ms, np.float32)
+        sums = np.concatenate(([0], np.cumsum(np.concatenate((padding, speaking, padding)), dtype=np.float64)))
+        window = sums[2 * ramp_ms:2 * ramp_ms + duration_ms] - sums[:duration_ms]
+        speaking = np.minimum(1, window / ramp_ms).astype(np.float32)
+
+    return 1 - speaking * (1 - _db_to_gain(duck_db))
+
+
+def compose(video_audio: AudioSegment, placements: list, bg_music: AudioSegment = None,
+            video_gain_db: float = VIDEO_GAIN_DB, music_gain_db: float = MUSIC_GAIN_DB,
+            duck_db: float = DUCK_DB) -> AudioSegment:
+    """
+    Mix the video sound, narration and background music into one track.
+
+    placements are (start_ms, AudioSegment) pairs. The output buffer is allocated
+    once at the video's length and format: the video sound and looped music are
+    written into it with their gains and ducking in a single chunked pass, then
+    each narration segment is added at its offset, trimmed at the end of the video.
+    """
+    frame_rate = video_audio.frame_rate
+    channels = video_audio.channels
+    out = _samples(video_audio, frame_rate, channels)
+    frames = len(out)
+    duration_ms = frames * 1000 // frame_rate + 1
+
+    narration = []
+    for start_ms, segment in placements:
+        samples = _samples(segment, frame_rate, channels)
+        narration.append((start_ms * frame_rate // 1000, samples))
+
+    envelope = duck_envelope(
+        duration_ms,
+        [(offset * 1000 // frame_rate, (offset + len(samples)) * 1000 // frame_rate)
+         for offset, samples in narration],
+        duck_db
+    )
+
+    music = None
+    if bg_music is not None and len(bg_music) > 0:
+        music = _samples(bg_music.fade_in(MUSIC_FADE_MS).fade_out(MUSIC_FADE_MS), frame_rate, channels)
+        music *= _db_to_gain(music_gain_db)
+
+    video_gain = _db_to_gain(video_gain_db)
+    step = CHUNK_SECONDS * frame_rate
+    for start in range(0, frames, step):
+        end = min(frames, start + step)
+        positions = np.arange(start, end)
+        gain = envelope[positions * 1000 // frame_rate][:, None]
+        chunk = out[start:end]
+        chunk *= gain * video_gain
+        if music is not None:
+            # Music loops for as long as the video runs
+            chunk += music[positions % len(music)] * gain
+
+    for offset, samples in narration:
+        if offset >= frames:
+            continue
+        samples = samples[:frames - offset]
+        out[offset:offset + len(samples)] += samples
+
+    np.clip(out, -1, 32767 / 32768, out=out)
+    pcm = (out * 32768).astype(np.int16)
+    return AudioSegment(pcm.tobytes(), frame_rate=frame_rate, sample_width=2, channels=channels)
@@ -0,0 +1,79 @@
+import math
+
+# How a segment that would run into the next one is handled
+GAP = 'gap'              # start it gap_ms after the previous segment ends
+COMPRESS = 'compress'    # time-compress the rendered speech to fit, then shift any remainder
+TEMPO = 'tempo'          # re-synthesize at a faster speaking rate to fit, then shift any remainder
+POLICIES = (GAP, COMPRESS, TEMPO)
+
+# Silence kept between segments that had to be moved
+DEFAULT_GAP_MS = 500
+# Fastest a segment may be played back under COMPRESS or TEMPO
+MAX_SPEEDUP = 1.3
+
+
+def schedule(segments: list, policy: str = GAP, gap_ms: int = DEFAULT_GAP_MS,
+             max_speedup: float = MAX_SPEEDUP, end_ms: int = None) -> list:
+    """
+    Place (requested_ms, duration_ms) segments on one timeline without overlaps.
+
+    Segments are sorted once by requested time and placed in a single sweep. Since
+    placed segments never overlap, the previous one always ends last, so each
+    segment starts at its requested time or gap_ms after that end, whichever is
+    later. Under COMPRESS and TEMPO a segment that would run past the next
+    requested start (or end_ms) is given a speed of up to max_speedup to fit.
+
+    Returns one dict per segment in input order: index, requested_ms, start_ms,
+    duration_ms (after any speedup), end_ms, speed, drift_ms and whether it
+    overruns end_ms.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown schedule policy: {policy}")
+
+    order = sorted(range(len(segments)), key=lambda i: segments[i][0])
+    plan = [None] * len(segments)
+    prev_end = None
+
+    for position, i in enumerate(order):
+        requested_ms, duration_ms = segments[i]
+        start_ms = requested_ms if prev_end is None else max(requested_ms, prev_end + gap_ms)
+
+        speed = 1.0
+        if policy != GAP:
+            if position + 1 < len(order):
+                limit = segments[order[position + 1]][0] - gap_ms
+                if end_ms is not None:
+                    limit = min(limit, end_ms)
+            else:
+                limit = end_ms
+            if limit is not None and start_ms + duration_ms > limit:
+                window = limit - start_ms
+                speed = round(min(max_speedup, duration_ms / window), 2) if window > 0 else max_speedup
+                duration_ms = math.ceil(duration_ms / speed)
+
+        prev_end = start_ms + duration_ms
+        plan[i] = {
+            "index": i,
+            "requested_ms": requested_ms,
+            "start_ms": start_ms,
+            "duration_ms": duration_ms,
+            "end_ms": prev_end,
+            "speed": speed,
+            "drift_ms": start_ms - requested_ms,
+            "overruns": end_ms is not None and prev_end > end_ms,
+        }
+
+    return plan
+
+
+def summarize(plan: list) -> dict:
+    """Totals for a schedule, for display next to it."""
+    drifts = [p["drift_ms"] for p in plan]
+    return {
+        "segments": len(plan),
+        "shifted": sum(1 for d in drifts if d > 0),
+        "max_drift_ms": max(drifts, default=0),
+        "total_drift_ms": sum(drifts),
+        "sped_up": sum(1 for p in plan if p["speed"] > 1),
+        "overrunning": sum(1 for p in plan if p["overruns"]),
+    }
@@ -1,11 +1,21 @@
 import os
+import json
+import math
 import subprocess
 
-def extract_audio(video_path: str) -> str:
+from mixdown import DUCK_DB, DUCK_RAMP_MS, MUSIC_FADE_MS, MUSIC_GAIN_DB, VIDEO_GAIN_DB
 
-    """Extract audio from video file."""
-    temp_dir = "./Temp"
+# How process_video produces the narrated soundtrack
+RENDER_MIXDOWN = "mixdown"          # extract to MP3, mix in Python, mux the result
+RENDER_FILTERGRAPH = "filtergraph"  # one ffmpeg run mixing every input straight into the output
+RENDER_MODES = (RENDER_MIXDOWN, RENDER_FILTERGRAPH)
+
+# Format every input is converted to before mixing in the filter graph
+MIX_FORMAT = "aformat=sample_fmts=fltp:sample_rates=44100:channel_layouts=stereo"
 
+def extract_audio(video_path: str, temp_dir: str = "./Temp") -> str:
+
+    """Extract audio from video file."""
     os.makedirs(temp_dir, exist_ok=True)
 
     
@@ -129,13 +139,132 @@ def combine_video_audio(video_path: str, audio_path: str) -> str:
     subprocess.run(cmd, check=True)
     return output_video
 
-def process_video(video_path: str, narration: str, bg_music_path: str = None) -> str:
+def probe_media(video_path: str) -> tuple:
+    """Return (duration in seconds, whether the file has an audio stream)."""
+    probe_cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "format=duration:stream=codec_type",
+        "-of", "json",
+        video_path
+    ]
+    result = subprocess.run(probe_cmd, capture_output=True, text=True, check=True)
+    metadata = json.loads(result.stdout)
+    duration = float(metadata.get('format', {}).get('duration') or 0)
+    has_audio = any(stream.get('codec_type') == 'audio' for stream in metadata.get('streams', []))
+    return duration, has_audio
+
+def duck_expression(plan: list, duck_db: float = DUCK_DB, ramp_ms: int = DUCK_RAMP_MS) -> str:
+    """
+    ffmpeg volume expression matching mixdown.duck_envelope(): each segment adds a
+    trapezoid ramping over ramp_ms either side, and the sum is capped at full depth.
+    """
+    if not plan:
+        return "1"
+    ramp = ramp_ms / 1000
+    terms = "+".join(
+        f"clip((t-{p['start_ms'] / 1000 - ramp:.3f})/{ramp},0,1)"
+        f"*clip(({p['end_ms'] / 1000 + ramp:.3f}-t)/{ramp},0,1)"
+        for p in plan
+    )
+    return f"1-{1 - 10 ** (duck_db / 20):.4f}*min(1,{terms})"
+
+def narration_filter_graph(plan: list, duration: float, music_input: int = None,
+                           music_duration: float = 0, bed_input: int = 0) -> str:
+    """
+    Filter graph mixing the video sound (bed_input), one input per narration segment
+    (inputs 1..n, in plan order) and optionally looped music, with the same levels
+    and ducking as mixdown.compose(). The mixed audio is labelled [aout].
+    """
+    fade = MUSIC_FADE_MS / 1000
+    filters = [f"[{bed_input}:a]{MIX_FORMAT},volume={VIDEO_GAIN_DB}dB[video]"]
+    bed = "[video]"
+    if music_input is not None:
+        filters.append(
+            # Faded before looping, so every repeat fades in and out as in compose()
+            f"[{music_input}:a]{MIX_FORMAT},afade=t=in:d={fade},"
+            f"afade=t=out:st={max(0, music_duration - fade):.3f}:d={fade},"
+            f"aloop=loop=-1:size={math.ceil(music_duration * 44100)},atrim=0:{duration:.3f},"
+            f"volume={MUSIC_GAIN_DB}dB[music]"
+        )
+        filters.append("[video][music]amix=inputs=2:duration=first:normalize=0[bedmix]")
+        bed = "[bedmix]"
+    filters.append(f"{bed}volume='{duck_expression(plan)}':eval=frame[bed]")
+
+    voices = []
+    for i, p in enumerate(plan, start=1):
+        chain = f"[{i}:a]{MIX_FORMAT}"
+        if p.get("atempo", 1) != 1:
+            chain += f",atempo={p['atempo']}"
+        filters.append(f"{chain},adelay={p['start_ms']}:all=1[n{i}]")
+        voices.append(f"[n{i}]")
+    # The bed comes first, so the mix ends with the video and trims late narration
+    filters.append(f"[bed]{''.join(voices)}amix=inputs={len(voices) + 1}:duration=first:normalize=0[aout]")
+    return ";\n".join(filters)
+
+def render_narrated_video(video_path: str, narration: str, bg_music_path: str, work_dir: str,
+                          policy: str, schedule: list = None) -> str:
+    """Narrate video_path in a single ffmpeg run: no intermediate audio files, video stream copied."""
+    from audio import prepare_narration
+
+    temp_dir = "./Temp"
+    os.makedirs(temp_dir, exist_ok=True)
+    output_video = f"{temp_dir}/narrated_{os.path.basename(video_path)}"
+    duration, has_audio = probe_media(video_path)
+    plan, _ = prepare_narration(narration, work_dir, int(duration * 1000), policy, stretch_audio=False)
+    if schedule is not None:
+        schedule.extend(plan)
+
+    cmd = ["ffmpeg", "-i", video_path]
+    bed_input = 0
+    if not has_audio:
+        # Silent bed for videos without sound, as extract_audio does
+        bed_input = 1 + len(plan)
+    for p in plan:
+        cmd += ["-i", p["path"]]
+    if not has_audio:
+        cmd += ["-f", "lavfi", "-i", f"anullsrc=r=44100:cl=stereo:d={duration}"]
+    music_input = None
+    music_duration = 0
+    if bg_music_path and os.path.exists(bg_music_path):
+        music_input = 1 + len(plan) + (0 if has_audio else 1)
+        music_duration, _ = probe_media(bg_music_path)
+        cmd += ["-i", bg_music_path]
+
+    graph = narration_filter_graph(plan, duration, music_input, music_duration, bed_input)
+    # Written to a file: one line per segment outgrows the command line on long videos
+    graph_path = os.path.join(work_dir, "narration.filtergraph")
+    with open(graph_path, "w") as f:
+        f.write(graph)
+
+    cmd += [
+        "-filter_complex_script", graph_path,
+        "-map", "0:v:0",
+        "-map", "[aout]",
+        "-c:v", "copy",  # Copy to preserve VR metadata
+        "-c:a", "aac",
+        "-b:a", "192k",
+        "-map_metadata", "0",
+        "-movflags", "use_metadata_tags",
+        output_video,
+        "-y"
+    ]
+    subprocess.run(cmd, check=True)
+    return output_video
+
+def process_video(video_path: str, narration: str, bg_music_path: str = None,
+                  policy: str = None, schedule: list = None,
+                  render_mode: str = RENDER_MIXDOWN) -> str:
     """Process video with narration and optional background music.
     
     Args:
         video_path: Path to original video
         narration: Text narration with timestamps
         bg_music_path: Optional path to background music
+        policy: How overlapping narration is resolved (see timeline.POLICIES)
+        schedule: Optional list that receives where each segment was placed
+        render_mode: RENDER_MIXDOWN, or RENDER_FILTERGRAPH to mix and mux in one
+            ffmpeg run; falls back to RENDER_MIXDOWN if that fails
         
     Returns:
 
@@ -143,21 +272,33 @@ def process_video(video_path: str, narration: str, bg_music_path: str = None) ->
     """
 
     from audio import mix_narration
+    import timeline
+    from artifacts import get_store
     
-    # Extract audio from video
-    video_audio_path = extract_audio(video_path)
-    
-    # Mix narration with video audio
-    final_audio_path = mix_narration(video_audio_path, narration, bg_music_path)
-    
-    # Combine video with new audio
-    output_video_path = combine_video_audio(video_path, final_audio_path)
-    
-
-    # Clean up intermediate audio files
-    # Keep these for debugging
-    # os.remove(video_audio_path)
+    policy = policy or timeline.GAP
+    if render_mode == RENDER_FILTERGRAPH:
+        try:
+            with get_store().job() as work_dir:
+                return render_narrated_video(
+                    video_path, narration, bg_music_path, work_dir, policy, schedule
+                )
+        except subprocess.CalledProcessError as e:
+            print(f"Single-pass render failed ({e}), falling back to mixdown")
+            if schedule is not None:
+                schedule.clear()
 
-    # os.remove(final_audio_path)
+    # Intermediate audio lives in a per-job directory that is removed afterwards
+    with get_store().job() as work_dir:
+        # Extract audio from video
+        video_audio_path = extract_audio(video_path, work_dir)
+        
+        # Mix narration with video audio
+        final_audio_path = mix_narration(
+            video_audio_path, narration, bg_music_path, work_dir,
+            policy=policy, schedule=schedule
+        )
+        
+        # Combine video with new audio
+        output_video_path = combine_video_audio(video_path, final_audio_path)
     
     return output_video_path